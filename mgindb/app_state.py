@@ -22,6 +22,7 @@ class AppState:
             cls.scheduled_tasks = {}  # Dictionary of scheduled tasks
             cls.sessions = {}  # Active sessions
             cls.config_store = {}  # Configuration store
+            cls.config_sets = {}  # Set mirrors of list-valued configuration entries for fast membership tests
             cls.blockchain = []  #  Blockchain
             cls.blockchain_pending_transactions = []  # Pending transactions
             cls.blockchain_mempool = []  # Mempool transactions
@@ -33,6 +34,10 @@ class AppState:
             cls.node_subscribers = set()  # Set of node subscribers
             cls.node_lite_subscribers = set()  # Set of node lite subscribers
             cls.sub_pub = {}  # Publish/subscribe dictionary
+            cls.replication_queue = None  # Commands waiting to be sent to the replication slaves
+            cls.replication_task = None  # Task draining the replication queue
+            cls.data_save_task = None  # Background save of the data store
+            cls.indices_save_task = None  # Background save of the indices
 
             # Cache
             cls.data_store_cache = {}
@@ -45,9 +50,36 @@ class AppState:
             cls.blockchain_txns_requests = {}
 
             # Changes tracking
-            cls.data_has_changed = False  # Flag to track data changes
-            cls.indices_has_changed = False  # Flag to track indices changes
+            cls._data_has_changed = False  # Flag to track data changes
+            cls.data_version = 0  # Incremented on every data change, used to invalidate derived results such as KEYS
+            cls._indices_has_changed = False  # Flag to track indices changes
+            cls.indices_version = 0  # Incremented on every indices change, used to invalidate query memoization
+            cls.config_version = 0  # Incremented on every configuration load or save, used to invalidate derived settings such as the shard URIs
             cls.blockchain_has_changed = False  # Flag to track blockchain changes
             cls.blockchain_pending_transactions_has_changed = False  # Flag to track blockchain pending transactions changes
             cls.blockchain_wallets_has_changed = False  # Flag to track blockchain wallets changes
         return cls._instance  # Return the singleton instance
+
+    @property
+    def data_has_changed(self):
+        """Flag to track data changes."""
+        return self._data_has_changed
+
+    @data_has_changed.setter
+    def data_has_changed(self, value):
+        """Sets the data change flag, bumping data_version whenever a change is recorded."""
+        if value:
+            self.data_version += 1
+        self._data_has_changed = value
+
+    @property
+    def indices_has_changed(self):
+        """Flag to track indices changes."""
+        return self._indices_has_changed
+
+    @indices_has_changed.setter
+    def indices_has_changed(self, value):
+        """Sets the indices change flag, bumping indices_version whenever a change is recorded."""
+        if value:
+            self.indices_version += 1
+        self._indices_has_changed = value
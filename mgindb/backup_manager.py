@@ -244,8 +244,8 @@ class BackupManager:
         Returns:
             str: A message indicating the result of the delete operation.
         """
-        host = AppState().config_store.get('HOST')  # Get host from config
-        port = AppState().config_store.get('PORT')  # Get port from config
+        host = self.app_state.config_store.get('HOST')  # Get host from config
+        port = self.app_state.config_store.get('PORT')  # Get port from config
 
         # Perform local deletion
         deleted_files = 0
@@ -258,8 +258,8 @@ class BackupManager:
             return "Backup directory not found."  # Return error if backup directory is not found
 
         # Check if sharding is enabled and we are in MASTER mode
-        if await sharding_manager.has_sharding_is_sharding_master():
-            shards = AppState().config_store.get('SHARDS')  # Get list of shards from config
+        if sharding_manager.has_sharding_is_sharding_master():
+            shards = self.app_state.config_store.get('SHARDS')  # Get list of shards from config
             shard_uris = [f"{shard}:{port}" for shard in shards if shard != host]  # Create URIs for shards
 
             # Broadcast DELETE BACKUP to all remote shards
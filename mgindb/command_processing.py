@@ -1,7 +1,6 @@
 # Import necessary modules and classes
 import ujson  # Module for JSON operations
 import re  # Module for regular expressions
-import time  # Module for time
 from .app_state import AppState  # Application state management
 from .connection_handler import asyncio, signal_stop  # Asynchronous programming and signal handling
 from .config import save_config  # Function to save configuration
@@ -19,7 +18,39 @@ from .cache_manager import CacheManager  # Cache management
 from .upload_manager import UploadManager  # Upload management
 from .two_factor_manager import TwoFactorManager  # Two Factor management
 
+# Configuration keys that cannot be removed with CONFIG DEL
+_PROTECTED_CONFIG_KEYS = frozenset({
+    'HOST', 'PORT', 'USERNAME', 'PASSWORD', 'BACKUP_ON_SHUTDOWN', 'SCHEDULER', 'REPLICATION', 'REPLICATION_TYPE',
+    'REPLICATION_AUTHORIZED_SLAVES', 'SHARDING_TYPE', 'SHARDING', 'SHARDING_BATCH_SIZE', 'SHARDS'
+})
+# Configuration keys holding a list of values (updated with ADD/DEL)
+_LIST_VALUED_CONFIG = frozenset({'REPLICATION_AUTHORIZED_SLAVES', 'SHARDS'})
+# Configuration keys that require a restart once changed
+_RESTART_KEYS = frozenset({'USERNAME', 'PASSWORD'})
+# First characters a JSON document can start with (ujson also accepts NaN/Infinity and leading whitespace)
+_JSON_START_CHARS = frozenset('{["-0123456789tfnNI \t\r\n')
+# Number of join ids processed before yielding back to the event loop
+_JOIN_PARTITION_SIZE = 10000
+# Number of local query results memoized for the current data and indices versions
+_QUERY_MEMO_SIZE = 512
+# Wallet addresses and the key/value split of a SET command
+_SENDER_ADDRESS_RE = re.compile(r"SENDER:([A-Za-z0-9]+)")
+_RECEIVER_ADDRESS_RE = re.compile(r"RECEIVER:([A-Za-z0-9]+)")
+_SET_COMMAND_RE = re.compile(r"([^ ]+) (.+)")
+# Commands whose argument is a JSON document
+_JSON_ARGUMENT_COMMANDS = frozenset({'REPLICATE_BATCH', 'SEND_TXN', 'SEND_INTERNAL_TXN', 'CREATE_CONTRACT', 'GET_CONTRACT', 'MINT_CONTRACT', 'BURN_CONTRACT'})
+# Commands whose handler also receives the session id
+_SESSION_ARGUMENT_COMMANDS = frozenset({'CONFIG', 'SUB', 'UNSUB', 'MONITOR'})
+
 class CommandProcessor:
+    __slots__ = (
+        'app_state', 'thread_executor', 'process_executor', 'websocket_manager', 'updater', 'scheduler_manager',
+        'sharding_manager', 'blockchain_manager', 'data_manager', 'indices_manager', 'backup_manager',
+        'sub_pub_manager', 'command_utils_manager', 'replication_manager', 'config_handler', 'data_handler',
+        'query_handler', 'shard_handler', 'cache_handler', 'upload_manager', 'two_factor_manager', 'command_table',
+        'background_tasks'
+    )  # Fixed attribute layout for faster lookups on the hot dispatch path
+
     def __init__(self, thread_executor, process_executor, websocket_manager):
         self.app_state = AppState()
         self.thread_executor = thread_executor
@@ -43,37 +74,43 @@ class CommandProcessor:
         self.cache_handler = CacheManager()
         self.upload_manager = UploadManager()
         self.two_factor_manager = TwoFactorManager()
+        self.command_table = self.build_command_table()  # Built once instead of on every command
+        self.background_tasks = set()  # Fire-and-forget tasks, referenced until they complete
 
     async def run_in_executor(self, executor_type, func, *args):
         loop = asyncio.get_running_loop()
         executor = self.thread_executor if executor_type == 'thread' else self.process_executor
-        start_time = time.time()
-        result = await loop.run_in_executor(executor, func, *args)
-        end_time = time.time()
-        return result
+        return await loop.run_in_executor(executor, func, *args)
 
     async def process_command(self, command_line, sid=False, websocket=None):
         command, args = self.parse_command_line(command_line)
         if command:
-            await self.notify_if_sid(sid, command_line)
-            result = await self.execute_command(command, args, sid, websocket)
-            return await self.handle_result(result)
+            self.notify_if_sid(sid, command_line)
+            return await self.execute_command(command, args, sid, websocket)  # Handlers are awaited or run in the executor, never returned as coroutines
         else:
             return "ERROR: Invalid command"
 
     def parse_command_line(self, command_line):
-        command_line = command_line.replace('-f', '')
-        tokens = command_line.split(maxsplit=1)
-        command = tokens[0].upper()
-        args = tokens[1] if len(tokens) > 1 else ""
-        return command, args
-
-    async def notify_if_sid(self, sid, command_line):
-        if sid:
-            await self.sub_pub_manager.notify_monitors(command_line, sid)
-
-    async def execute_command(self, command, args, sid, websocket):
-        commands = {
+        if '-f' in command_line:
+            command_line = command_line.replace('-f', '')  # The display flag can appear anywhere in the line
+        tokens = command_line.split(None, 1)  # Any whitespace separates the command, as in "KEYS\n"
+        if not tokens:
+            return "", ""
+        command = tokens[0]
+        if command not in self.command_table:  # Commands sent in upper case are used as is
+            command = command.upper()
+        return command, tokens[1] if len(tokens) > 1 else ""
+
+    def notify_if_sid(self, sid, command_line):
+        if sid and self.app_state.monitor_subscribers:
+            # Monitor notifications are best effort, so they run alongside the command instead of delaying it
+            task = asyncio.create_task(self.sub_pub_manager.notify_monitors(command_line, sid))
+            self.background_tasks.add(task)  # Keep a reference until the task is done
+            task.add_done_callback(self.background_tasks.discard)
+
+    def build_command_table(self):
+        """Binds every command to its handler once, together with how the handler is called."""
+        handlers = {
             'CHECKUPDATE': self.updater.check_update,
             'CONFIG': self.config_handler.handle_command,
             'SERVERSTOP': self.server_stop,
@@ -94,6 +131,7 @@ class CommandProcessor:
             'FLUSHALL': self.data_handler.flush_all_command,
             'FLUSHCACHE': self.cache_handler.flush_cache,
             'REPLICATE': self.shard_handler.replicate_command,
+            'REPLICATE_BATCH': self.shard_handler.replicate_batch_command,
             'RESHARD': self.shard_handler.reshard_command,
             'ROLLBACK': self.backup_manager.backup_rollback,
             'BLOCKCHAIN': self.blockchain_manager.get_blockchain,
@@ -121,91 +159,83 @@ class CommandProcessor:
             'NEW_2FA': self.two_factor_manager.generate,
             'VERIFY_2FA': self.two_factor_manager.verify
         }
-
-        if command in commands:
-            func = commands[command]
-            if asyncio.iscoroutinefunction(func):
-                if command == 'SAVE_FILE':
-                    key, data = args.split(' ', 1)
-                    return await func(key, data)
-                elif command in {'SEND_TXN', 'SEND_INTERNAL_TXN', 'CREATE_CONTRACT', 'GET_CONTRACT', 'MINT_CONTRACT', 'BURN_CONTRACT'}:
-                    return await func(ujson.loads(args))
-                elif command in {'INCR', 'DECR'}:
-                    return await func(args, True if command == 'INCR' else False)
-                elif command in {'CONFIG', 'SUB', 'UNSUB', 'MONITOR'}:
-                    return await func(args, sid)
-                elif command == 'BLOCK':
-                    return await func(args)
-                elif command == 'NEW_2FA':
-                    account_name, issuer_name = args.split(' ')
-                    return await func(account_name, issuer_name)
-                elif command == 'VERIFY_2FA':
-                    secret, code = args.split(' ')
-                    return await func(secret, code)
-                elif command == 'BLOCKCHAIN':
-                    async_gen = await func(args)
-                    async for chunk in async_gen:
-                        await websocket.send(chunk)
-                    return None
-                elif command in {'SUBMIT_TXNS_RESULT', 'SUBMIT_BLOCK'}:
-                    request_id, data = args.split(' ', 1)
-                    return await func(request_id, data)
-                elif command == 'GET_BLOCKS' or command == 'GET_TXNS':
-                    options = {}
-                    if 'LATEST' in args:
-                        latest_value = args.split('LATEST')[1].strip().split()[0].strip('()')
-                        options['latest'] = latest_value.lower() == 'true'
-                    if 'LIMIT' in args:
-                        limit_value = args.split('LIMIT')[1].strip().split()[0].strip('()')
-                        options['limit'] = limit_value
-                    if 'ORDERBY' in args:
-                        order_value = args.split('ORDERBY')[1].strip().split()[0].strip('()')
-                        options['order'] = order_value
-                    return await func(options)
-                else:
-                    return await func(args)
-            else:
-                if command == 'SAVE_FILE':
-                    key, data = args.split(' ', 1)
-                    return await self.run_in_executor('thread', func, key, data.encode())
-                elif command in {'SEND_TXN', 'SEND_INTERNAL_TXN', 'CREATE_CONTRACT', 'GET_CONTRACT', 'MINT_CONTRACT', 'BURN_CONTRACT'}:
-                    return await self.run_in_executor('thread', func, ujson.loads(args))
-                elif command in {'INCR', 'DECR'}:
-                    return await self.run_in_executor('thread', func, args, True if command == 'INCR' else False)
-                elif command in {'CONFIG', 'SUB', 'UNSUB', 'MONITOR'}:
-                    return await self.run_in_executor('thread', func, args, sid)
-                elif command == 'NEW_2FA':
-                    account_name, issuer_name = args.split(' ')
-                    return await self.run_in_executor('thread', func, account_name, issuer_name)
-                elif command == 'VERIFY_2FA':
-                    secret, code = args.split(' ')
-                    return await self.run_in_executor('thread', func, secret, code)
-                elif command == 'SUBMIT_TXNS_RESULT' or command == 'SUBMIT_BLOCK':
-                    request_id, data = args.split(' ', 1)
-                    return await self.run_in_executor('thread', func, request_id, data)
-                elif command == 'GET_BLOCKS' or command == 'GET_TXNS':
-                    options = {}
-                    if 'LATEST' in args:
-                        latest_value = args.split('LATEST')[1].strip().split()[0].strip('()')
-                        options['latest'] = latest_value.lower() == 'true'
-                    if 'LIMIT' in args:
-                        limit_value = args.split('LIMIT')[1].strip().split()[0].strip('()')
-                        options['limit'] = limit_value
-                    if 'ORDER' in args:
-                        order_value = args.split('ORDER')[1].strip().split()[0].strip('()')
-                        options['order'] = order_value
-                    return await self.run_in_executor('thread', func, options)
-                else:
-                    return await self.run_in_executor('thread', func, args)
+        command_table = {}
+        for command, func in handlers.items():
+            is_coroutine = asyncio.iscoroutinefunction(func)  # Coroutine handlers are awaited, the others run in the thread executor
+            command_table[command] = (func, is_coroutine, self.get_argument_parser(command, is_coroutine))
+        return command_table
+
+    def get_argument_parser(self, command, is_coroutine):
+        """Returns the function turning the raw arguments of a command into the handler's positional arguments."""
+        if command == 'SAVE_FILE':
+            return self.parse_file_arguments if is_coroutine else self.parse_file_bytes_arguments
+        elif command in _JSON_ARGUMENT_COMMANDS:
+            return lambda args, sid: (ujson.loads(args),)
+        elif command in {'INCR', 'DECR'}:
+            increment = command == 'INCR'
+            return lambda args, sid: (args, increment)
+        elif command in _SESSION_ARGUMENT_COMMANDS:
+            return lambda args, sid: (args, sid)
+        elif command in {'NEW_2FA', 'VERIFY_2FA'}:
+            return self.parse_pair_arguments
+        elif command in {'SUBMIT_TXNS_RESULT', 'SUBMIT_BLOCK'}:
+            return self.parse_request_arguments
+        elif command in {'GET_BLOCKS', 'GET_TXNS'}:
+            order_keyword = 'ORDERBY' if is_coroutine else 'ORDER'
+            return lambda args, sid: (self.parse_list_options(args, order_keyword),)
         else:
-            return None
+            return lambda args, sid: (args,)
+
+    @staticmethod
+    def parse_file_arguments(args, sid):
+        key, data = args.split(' ', 1)
+        return key, data
+
+    @staticmethod
+    def parse_file_bytes_arguments(args, sid):
+        key, data = args.split(' ', 1)
+        return key, data.encode()
+
+    @staticmethod
+    def parse_pair_arguments(args, sid):
+        first, second = args.split(' ')
+        return first, second
+
+    @staticmethod
+    def parse_request_arguments(args, sid):
+        request_id, data = args.split(' ', 1)
+        return request_id, data
+
+    @staticmethod
+    def parse_list_options(args, order_keyword):
+        options = {}
+        if 'LATEST' in args:
+            latest_value = args.split('LATEST')[1].strip().split()[0].strip('()')
+            options['latest'] = latest_value.lower() == 'true'
+        if 'LIMIT' in args:
+            limit_value = args.split('LIMIT')[1].strip().split()[0].strip('()')
+            options['limit'] = limit_value
+        if order_keyword in args:
+            order_value = args.split(order_keyword)[1].strip().split()[0].strip('()')
+            options['order'] = order_value
+        return options
 
-    async def handle_result(self, result):
-        """Handles the result of a command execution."""
-        if asyncio.iscoroutine(result):
-            return await result
-        else:
-            return result
+    async def execute_command(self, command, args, sid, websocket):
+        entry = self.command_table.get(command)
+        if entry is None:
+            return None
+        func, is_coroutine, parse_arguments = entry
+        arguments = parse_arguments(args, sid)
+        if not is_coroutine:
+            return await self.run_in_executor('thread', func, *arguments)
+        if command == 'BLOCKCHAIN':
+            async_gen = await func(*arguments)
+            async for chunk in async_gen:
+                await websocket.send(chunk)
+            return None
+        if command == 'RESHARD':
+            return await func(*arguments, websocket=websocket)  # Shards stream their stores back on the requesting connection
+        return await func(*arguments)
 
     async def forward_to_blockchain(self, command):
         if self.websocket_manager.blockchain_websocket:
@@ -213,19 +243,14 @@ class CommandProcessor:
         else:
             return "ERROR: Blockchain WebSocket is not connected."
 
-    async def handle_result(self, result):
-        """Handles the result of a command execution."""
-        if asyncio.iscoroutine(result):
-            return await result
-        else:
-            return result
-
     async def server_stop(self, *args, **kwargs):
         """Stops the server."""
         await signal_stop()
         return 'exit'
 
 class ConfigCommandHandler:
+    __slots__ = ('app_state', 'processor')
+
     def __init__(self, processor):
         self.app_state = AppState()
         self.processor = processor  # Reference to the CommandProcessor
@@ -261,10 +286,10 @@ class ConfigCommandHandler:
         key = parts[1]
         value = parts[2]
 
-        if key == 'SHARDING' and value == '1' and (not self.app_state.config_store.get('SHARDS') or len(self.app_state.config_store.get('SHARDS')) == 0):
+        if key == 'SHARDING' and value == '1' and not self.app_state.config_store.get('SHARDS'):  # An empty list is falsy
             return "ERROR: Cannot enable SHARDING without defined SHARDS. First run the command CONFIG SET SHARDS ADD serverip/domain"
 
-        if key in ['REPLICATION_AUTHORIZED_SLAVES', 'SHARDS']:
+        if key in _LIST_VALUED_CONFIG:
             return await self.handle_config_set_replication_shards(key, value)  # Handle replication and shards configuration
         else:
             return await self.handle_config_set_value(key, value)  # Handle other configuration values
@@ -276,6 +301,7 @@ class ConfigCommandHandler:
 
         if key not in self.app_state.config_store or not isinstance(self.app_state.config_store[key], list):
             self.app_state.config_store[key] = []
+            self.app_state.config_sets.pop(key, None)  # Drop the stale set mirror
 
         if operation == 'ADD':
             return await self.handle_config_add_to_list(key, value)  # Add value to the list
@@ -284,30 +310,41 @@ class ConfigCommandHandler:
         else:
             return f"ERROR: Invalid operation for {key} (ADD/DEL required)"
 
+    def get_config_set(self, key):
+        """Returns the set mirror of a configuration list, building it on first use."""
+        members = self.app_state.config_sets.get(key)
+        if members is None:
+            members = self.app_state.config_sets[key] = set(self.app_state.config_store.get(key, []))
+        return members
+
     async def handle_config_add_to_list(self, key, value):
         """Adds a value to a configuration list."""
-        if value not in self.app_state.config_store[key]:
+        members = self.get_config_set(key)
+        if value not in members:
             self.app_state.config_store[key].append(value)
+            members.add(value)
             save_config()  # Save the updated configuration
             res = f"Added {value} to {key}"
         else:
             res = f"{value} already in {key}"
-        if key == 'SHARDS' and await self.processor.sharding_manager.has_sharding() and await self.processor.sharding_manager.is_sharding_master():
+        if key == 'SHARDS' and self.processor.sharding_manager.has_sharding_is_sharding_master():
             await self.processor.shard_handler.reshard_command()  # Reshard data if sharding is enabled
             res += " and resharded data to shards"
         return res
 
     async def handle_config_remove_from_list(self, key, value):
         """Removes a value from a configuration list."""
-        if value in self.app_state.config_store[key]:
+        members = self.get_config_set(key)
+        if value in members:
             if key == 'SHARDS' and value == self.app_state.config_store.get('HOST') and self.app_state.config_store.get('SHARDING') == '1':
                 return "ERROR: Cannot remove the host from SHARDS while SHARDING is enabled. First run the command CONFIG SET SHARDING 0"
             self.app_state.config_store[key].remove(value)
+            members.discard(value)
             save_config()  # Save the updated configuration
             res = f"Removed {value} from {key}"
         else:
             res = f"{value} not found in {key}"
-        if key == 'SHARDS' and await self.processor.sharding_manager.has_sharding() and await self.processor.sharding_manager.is_sharding_master():
+        if key == 'SHARDS' and self.processor.sharding_manager.has_sharding_is_sharding_master():
             await self.processor.shard_handler.reshard_command()  # Reshard data if sharding is enabled
             res += " and resharded data to shards"
         return res
@@ -322,13 +359,13 @@ class ConfigCommandHandler:
 
         response = f"Config updated: {key} set to {value}"
 
-        restart_required = key in ['USERNAME', 'PASSWORD']
+        restart_required = key in _RESTART_KEYS
 
         if restart_required:
             response += " - Restart required to apply new settings."
             self.app_state.restart_required = True
 
-        if key == 'SHARDING' and await self.processor.sharding_manager.is_sharding_master():
+        if key == 'SHARDING' and self.processor.sharding_manager.is_sharding_master():
             reshard_response = await self.processor.shard_handler.reshard_command()
             response += f" - {reshard_response}" if value == '1' else " - Data stored on Master"
 
@@ -344,8 +381,7 @@ class ConfigCommandHandler:
 
     async def handle_config_del_command(self, key):
         """Deletes a configuration key."""
-        protected_keys = ['HOST', 'PORT', 'USERNAME', 'PASSWORD', 'BACKUP_ON_SHUTDOWN', 'SCHEDULER', 'REPLICATION', 'REPLICATION_TYPE', 'REPLICATION_AUTHORIZED_SLAVES', 'SHARDING_TYPE', 'SHARDING', 'SHARDING_BATCH_SIZE', 'SHARDS']
-        if key in protected_keys:
+        if key in _PROTECTED_CONFIG_KEYS:
             return f"ERROR: Cannot delete essential configuration key '{key}'"
         if key in self.app_state.config_store:
             del self.app_state.config_store[key]
@@ -355,103 +391,130 @@ class ConfigCommandHandler:
             return f"Configuration key '{key}' does not exist"
 
 class DataCommandHandler:
+    __slots__ = ('app_state', 'processor', 'keys_cache')
+
     def __init__(self, processor):
         self.app_state = AppState()
         self.processor = processor  # Reference to the CommandProcessor
+        self.keys_cache = None  # (data_version, JSON list of the top-level keys) of the last KEYS command
 
-    def keys_command(self, *args, **kwargs):
+    async def keys_command(self, *args, **kwargs):
         """Handles the KEYS command."""
-        data_store = self.app_state.data_store  # Access the data store
-        main_keys = list(data_store.keys())  # Get the list of main keys
-        return ujson.dumps(sorted(main_keys))  # Return the sorted list of keys as a JSON string
+        data_version = self.app_state.data_version
+        if self.keys_cache is None or self.keys_cache[0] != data_version:
+            # Every data change bumps data_version, so the sorted key list is only rebuilt after a write
+            self.keys_cache = (data_version, ujson.dumps(sorted(self.app_state.data_store)))
+        return self.keys_cache[1]  # Return the sorted list of keys as a JSON string
 
     async def count_command(self, args):
         """Handles the COUNT command."""
-        parts = args.split('WHERE', 1)  # Split the arguments by 'WHERE'
-        root = parts[0].strip()  # Get the root key
-        conditions = parts[1].strip() if len(parts) > 1 else ""  # Get the conditions
+        root, _, conditions = args.partition('WHERE')  # Split the arguments by 'WHERE'
+        root = root.strip()  # Get the root key
+        conditions = conditions.strip()  # Get the conditions
 
         # Use process_local_query to get the filtered results
         results = await self.processor.query_handler.process_local_query(root, f"WHERE {conditions}" if conditions else "")
 
-        if isinstance(results, list):
-            return len(results)  # Return the number of results if it's a list
-        elif isinstance(results, dict):
-            return len(results.keys())  # Return the number of keys if it's a dictionary
-        return 0  # Return 0 if no results
+        try:
+            return len(results)  # Number of results for a list, number of keys for a dictionary
+        except TypeError:
+            return 0  # Return 0 if no results
 
     async def set_command(self, args):
         """Handles the SET command."""
-        commands = args.split('|')  # Split the commands by '|'
-        responses = []
-        sharding_active = await self.processor.sharding_manager.has_sharding()  # Check if sharding is active
-        for command in commands:
-            # Extract wallet if present
-            sender_address_match = re.search(r"SENDER:([A-Za-z0-9]+)", command.strip())  # Match the wallet pattern
-            receiver_address_match = re.search(r"RECEIVER:([A-Za-z0-9]+)", command.strip())  # Match the wallet pattern
-
-            if sender_address_match:
-                sender_address = sender_address_match.group(1)  # Extract the wallet value
-                command = re.sub(r"SENDER:[A-Za-z0-9]+", "", command.strip())  # Remove the wallet part from the command
-            else:
-                sender_address = None  # No wallet found
-            
-            if receiver_address_match:
-                receiver_address = receiver_address_match.group(1)  # Extract the wallet value
-                command = re.sub(r"RECEIVER:[A-Za-z0-9]+", "", command.strip())  # Remove the wallet part from the command
+        commands = args.split('|') if '|' in args else (args,)  # Split the commands by '|', a single command needs no list
+        return await self._set_commands(commands)
+
+    async def _set_commands(self, commands):
+        """Applies SET commands that are already split, e.g. a replicated SET whose value may contain '|'."""
+        responses = [None] * len(commands)
+        pending = []  # Valid SET commands, applied once every shard has been routed
+        scheduler_required = False
+        sharding_active = self.processor.sharding_manager.has_sharding()  # Check if sharding is active
+        scheduler_active = self.processor.scheduler_manager.is_scheduler_active()  # Stable for the whole pipeline
+        for position, command in enumerate(commands):
+            # Extract wallets if present, the substring test skips both regexes for plain SET commands
+            sender_address = None  # No wallet found
+            receiver_address = None  # No wallet found
+            if 'SENDER:' in command or 'RECEIVER:' in command:
+                command = command.strip()
+                sender_address_match = _SENDER_ADDRESS_RE.search(command)  # Match the wallet pattern
+                if sender_address_match:
+                    sender_address = sender_address_match.group(1)  # Extract the wallet value
+                    command = command[:sender_address_match.start()] + command[sender_address_match.end():]  # Cut the wallet part out of the command
+
+                receiver_address_match = _RECEIVER_ADDRESS_RE.search(command)  # Match the wallet pattern
+                if receiver_address_match:
+                    receiver_address = receiver_address_match.group(1)  # Extract the wallet value
+                    command = command[:receiver_address_match.start()] + command[receiver_address_match.end():]  # Cut the wallet part out of the command
+
+            # Extract command, splitting at the first space without a regex unless a newline could end the value early
+            command_text = command.strip()
+            if '\n' in command_text:
+                match = _SET_COMMAND_RE.match(command_text)  # Match the command pattern
+                key_pattern, raw_value = match.groups() if match else ('', '')
             else:
-                receiver_address = None  # No wallet found
-            
-            # Extract command
-            match = re.match(r"([^ ]+) (.+)", command.strip())  # Match the command pattern
-            if not match:
-                responses.append("ERROR: Invalid SET syntax")
+                key_pattern, _, raw_value = command_text.partition(' ')  # Get the key pattern and the raw value
+            if not raw_value:
+                responses[position] = "ERROR: Invalid SET syntax"
                 continue
 
-            key_pattern = match.group(1)  # Get the key pattern
-            raw_value = match.group(2)  # Get the raw value
+            if 'EXPIRE' in raw_value and not scheduler_active:
+                scheduler_required = True  # The commands before this one are still applied
+                break
 
-            if 'EXPIRE' in raw_value and not self.processor.scheduler_manager.is_scheduler_active():
-                return "Scheduler is not active. Run the command CONFIG SET SCHEDULER 1 to activate"
-            
-            value, expiry = self.processor.command_utils_manager.parse_value_instructions(raw_value)  # Parse the value instructions
-            context = self.processor.command_utils_manager.get_context_from_key(self.app_state.data_store, key_pattern)  # Get the context from the key
-            value = self.processor.command_utils_manager.handle_expression_functions(value, context)  # Handle expression functions
             parts = key_pattern.split(':')  # Split the key pattern by ':'
-            sharding_key = ':'.join(parts[:2]) if len(parts) > 1 else parts[0]  # Get the sharding key
+            sharding_key = key_pattern[:len(parts[0]) + len(parts[1]) + 1] if len(parts) > 2 else key_pattern  # Get the sharding key (first two segments)
 
             if '*' in parts and sharding_active:
-                responses.append("ERROR: Wildcard operations are not supported in sharding mode.")
+                responses[position] = "ERROR: Wildcard operations are not supported in sharding mode."
                 continue
 
-            shard_result = await self.processor.sharding_manager.check_sharding('SET', command, sharding_key)  # Check sharding for SET command
+            pending.append((position, command, key_pattern, raw_value, parts, sharding_key, sender_address, receiver_address))
+
+        if sharding_active:
+            shard_results = await self.processor.sharding_manager.check_sharding_batch('SET', [(entry[1], entry[5]) for entry in pending])
+        else:
+            shard_results = ['LOCAL'] * len(pending)
+
+        has_blockchain = await self.processor.blockchain_manager.has_blockchain()
+        replicated_commands = []
+        for (position, command, key_pattern, raw_value, parts, sharding_key, sender_address, receiver_address), shard_result in zip(pending, shard_results):
             if shard_result != "ERROR" and shard_result != 'LOCAL':
-                responses.append(ujson.dumps({"message": "OK"}))
+                responses[position] = ujson.dumps({"message": "OK"})
                 continue
             elif shard_result == "ERROR":
-                responses.append("ERROR: Sharding failed")
+                responses[position] = "ERROR: Sharding failed"
                 continue
 
+            value, expiry = self.processor.command_utils_manager.parse_value_instructions(raw_value)  # Parse the value instructions
+            context = self.processor.command_utils_manager.get_context_from_key(self.app_state.data_store, key_pattern)  # Get the context from the key
+            value = self.processor.command_utils_manager.handle_expression_functions(value, context)  # Handle expression functions
+
             if '*' in parts:
                 base_path = parts[:parts.index('*')]  # Get the base path
                 last_key = parts[-1]  # Get the last key
-                updated = await self.set_keys_wildcard(base_path, last_key, value, self.app_state.data_store)  # Set keys with wildcard
-                responses.append(f"Updated {updated} entries.")
+                updated = await self.set_keys_wildcard(base_path, last_key, value, self.app_state.data_store, persist=False)  # Set keys with wildcard
+                responses[position] = f"Updated {updated} entries."
             else:
-                response = await self.set_specific_key(parts, value)  # Set a specific key
-                responses.append(response)
+                responses[position] = await self.set_specific_key(parts, value, key_pattern, persist=False)  # Set a specific key
 
             if expiry:
                 self.app_state.expires_store[key_pattern] = expiry  # Set the expiry
-            
+
             # Add transaction to the blockchain
-            if await self.processor.blockchain_manager.has_blockchain():
+            if has_blockchain:
                 await self.add_tx_to_blockchain(sender_address, receiver_address, command)
 
-            if await self.processor.replication_manager.has_replication_is_replication_master():
-                replication_command = f"SET {':'.join(parts)} {value}"
-                await self.processor.replication_manager.send_command_to_slaves(replication_command)  # Replicate the command to slaves
+            replicated_commands.append(f"{key_pattern} {value}")
+
+        if replicated_commands and await self.processor.replication_manager.has_replication_is_replication_master():
+            # One command line per key, so a value containing '|' is not split into several commands on the slaves
+            await self.processor.replication_manager.queue_commands_to_slaves(f"SET {command}" for command in replicated_commands)  # Replicate the commands to slaves
 
+        self.persist_data()  # Save once for the whole batch
+        if scheduler_required:
+            return "Scheduler is not active. Run the command CONFIG SET SCHEDULER 1 to activate"
         return '\n'.join(responses)
     
     async def add_tx_to_blockchain(self, sender_address, receiver_address, command):
@@ -470,161 +533,219 @@ class DataCommandHandler:
             command = f'SEND_INTERNAL_TXN {ujson.dumps(payload)}'
             await self.processor.forward_to_blockchain(command)
 
-    async def set_keys_wildcard(self, base_path, last_key, value, data_store):
+    async def set_keys_wildcard(self, base_path, last_key, value, data_store, persist=True):
         """Sets keys using wildcard in the base path."""
-        try:
-            parsed_value = ujson.loads(value)  # Parse the value as JSON
-        except ujson.JSONDecodeError:
-            parsed_value = value
+        parsed_value = value
+        if value[:1] in _JSON_START_CHARS:  # Only run the parser on values that can be JSON
+            try:
+                parsed_value = ujson.loads(value)  # Parse the value as JSON, once for the whole document
+            except ujson.JSONDecodeError:
+                pass
+        return await self._set_parsed(base_path, last_key, parsed_value, data_store, persist)
+
+    async def _set_parsed(self, base_path, last_key, parsed_value, data_store, persist=True):
+        """Sets keys using wildcard in the base path from an already parsed value."""
+        # Flatten nested documents into (last key, leaf value) pairs with an explicit stack instead of recursive coroutines
+        leaves = []
+        stack = [(last_key, parsed_value)]
+        while stack:
+            key, val = stack.pop()
+            if isinstance(val, dict):
+                stack.extend(reversed([(f"{key}:{nested_key}", nested_val) for nested_key, nested_val in val.items()]))  # Keep the document order
+            else:
+                leaves.append((key, val))
+
+        total_updated_count = 0
+        for leaf_key, leaf_value in leaves:
+            total_updated_count += await self.set_wildcard_leaf(base_path, leaf_key, leaf_value, data_store)
+        if persist:
+            self.persist_data()  # Save once for all the nested keys
+        return total_updated_count
+
+    async def set_wildcard_leaf(self, base_path, last_key, parsed_value, data_store):
+        """Sets a single non-document value on every entry under the wildcard."""
+        index_removals = []
+        index_additions = []
+
+        has_indices = bool(self.app_state.indices)  # Skip collecting index updates when no index is defined
+
+        def descend_and_set(current):
+            for part in base_path:  # Walk the fixed prefix iteratively
+                if not isinstance(current, dict) or part not in current:
+                    return 0
+                current = current[part]
+            count = 0
+            for item_key, item_value in current.items():
+                if has_indices:
+                    full_path = base_path + [item_key, last_key]
+                    entity_key = ':'.join(full_path[:2]) if len(full_path) > 2 else full_path[0]
+                    old_value = item_value.get(last_key)
+                    if old_value is not None and old_value != parsed_value:
+                        index_removals.append((full_path, last_key, old_value, entity_key))
+                    index_additions.append((full_path, last_key, parsed_value, entity_key))
+                item_value[last_key] = parsed_value
+                count += 1
+            return count
 
-        if isinstance(parsed_value, dict):
-            total_updated_count = 0
-            for key, val in parsed_value.items():
-                nested_last_key = f"{last_key}:{key}"
-                updated_count = await self.set_keys_wildcard(base_path, nested_last_key, ujson.dumps(val), data_store)  # Recursively set keys
-                total_updated_count += updated_count
-            return total_updated_count
-        else:
-            async def recursive_set(current, depth):
-                count = 0
-                if depth == len(base_path):
-                    for item_key, item_value in current.items():
-                        full_path = base_path + [item_key, last_key]
-                        entity_key = ':'.join(full_path[:2]) if len(full_path) > 2 else full_path[0]
-                        old_value = item_value.get(last_key)
-                        if old_value is not None and old_value != parsed_value:
-                            await self.processor.indices_manager.update_index_on_remove(full_path, last_key, old_value, entity_key)
-                        item_value[last_key] = parsed_value
-                        await self.processor.indices_manager.update_index_on_add(full_path, last_key, parsed_value, entity_key)
-                        count += 1
-                    return count
-                elif base_path[depth] in current:
-                    return await recursive_set(current[base_path[depth]], depth + 1)
-                return 0
-
-            updated_count = await recursive_set(data_store, 0)  # Recursively set keys
-            if updated_count > 0:
+        updated_count = descend_and_set(data_store)  # Set the keys under the wildcard
+        # Update the indices in one batch instead of once per entry
+        await self.processor.indices_manager.bulk_update_index_on_remove(index_removals, persist=False)
+        await self.processor.indices_manager.bulk_update_index_on_add(index_additions, persist=False)
+        if updated_count > 0:
+            await self.processor.cache_handler.remove_from_cache(base_path)  # Invalidate cache entries
+            if self.processor.sub_pub_manager.has_subscribers():
                 full_key = ':'.join(base_path + [last_key])
                 full_data = data_store
-                await self.processor.cache_handler.remove_from_cache(base_path)  # Invalidate cache entries
                 await self.processor.sub_pub_manager.notify_subscribers(full_key, full_data)  # Notify subscribers
 
-            self.app_state.data_has_changed = True
-
-            if not self.processor.scheduler_manager.is_scheduler_active():
-                self.processor.data_manager.save_data()  # Save data if scheduler is not active
-            return updated_count
+        self.app_state.data_has_changed = True
+        return updated_count
 
-    async def set_specific_key(self, parts, value):
+    async def set_specific_key(self, parts, value, full_key=None, persist=True):
         """Sets a specific key."""
-        try:
-            parsed_value = ujson.loads(value)  # Parse the value as JSON
-            if isinstance(parsed_value, dict):
-                for key, val in parsed_value.items():
-                    nested_parts = parts + [key]
-                    await self.set_individual_key(nested_parts, val)  # Set individual keys recursively
-                return ujson.dumps({"message": "OK"})
-        except ujson.JSONDecodeError:
-            parsed_value = value
-        return await self.set_individual_key(parts, parsed_value)  # Set the individual key
+        parsed_value = value
+        if value[:1] in _JSON_START_CHARS:  # Only run the parser on values that can be JSON
+            try:
+                parsed_value = ujson.loads(value)  # Parse the value as JSON
+            except ujson.JSONDecodeError:
+                pass
 
-    async def set_individual_key(self, parts, value):
-        """Sets an individual key."""
+        if isinstance(parsed_value, dict):
+            full_key = full_key or ':'.join(parts)
+            notifications = []
+            for key, val in parsed_value.items():
+                nested_parts = parts + [key]
+                await self.set_individual_key(nested_parts, val, f"{full_key}:{key}", notifications, False)  # Set individual keys recursively
+            await self.processor.sub_pub_manager.notify_subscribers_batch(notifications)  # Notify the subscribers of every field, one message per key
+            if persist:
+                self.persist_data()  # Save once for the whole document
+            return ujson.dumps({"message": "OK"})
+        return await self.set_individual_key(parts, parsed_value, full_key, persist=persist)  # Set the individual key
+
+    async def set_individual_key(self, parts, value, full_key=None, notifications=None, persist=True):
+        """Sets an individual key, collecting the notification into notifications when given."""
         current = self.app_state.data_store
         for part in parts[:-1]:
             current = current.setdefault(part, {})  # Navigate to the appropriate part of the data store
         base_key = parts[0]
         last_key = parts[-1]
-        entity_key = ':'.join(parts[:2]) if len(parts) > 2 else parts[0]
+        has_indices = bool(self.app_state.indices)  # Index updates are no-ops without any index defined
+        if has_indices:
+            entity_key = ':'.join(parts[:2]) if len(parts) > 2 else parts[0]
 
-        if last_key in current and current[last_key] != value:
-            await self.processor.indices_manager.update_index_on_remove(parts, last_key, current[last_key], entity_key)
+        if has_indices and last_key in current and current[last_key] != value:
+            await self.processor.indices_manager.update_index_on_remove(parts, last_key, current[last_key], entity_key, persist=False)
 
-        if isinstance(value, str) and value.startswith('[') and value.endswith(']'):
+        if isinstance(value, str) and value[:1] == '[':  # The parser rejects anything that is not a complete array
             try:
                 value = ujson.loads(value)
             except ujson.JSONDecodeError:
                 pass
 
         current[last_key] = value  # Set the value
-        await self.processor.indices_manager.update_index_on_add(parts, last_key, value, entity_key)  # Update the index
+        if has_indices:
+            await self.processor.indices_manager.update_index_on_add(parts, last_key, value, entity_key, persist=False)  # Update the index, saved with the data
         await self.processor.cache_handler.remove_from_cache(base_key)  # Invalidate cache entries
 
-        full_key = ':'.join(parts)
-        await self.processor.sub_pub_manager.notify_subscribers(full_key, current)  # Notify subscribers
+        if self.processor.sub_pub_manager.has_subscribers():
+            full_key = full_key or ':'.join(parts)  # Callers pass the original key string to avoid re-joining it
+            if notifications is None:
+                await self.processor.sub_pub_manager.notify_subscribers(full_key, current)  # Notify subscribers
+            else:
+                notifications.append((full_key, current.copy()))  # Notified in batch by the caller, with the fields as they are at this write
 
         self.app_state.data_has_changed = True
 
-        if not self.processor.scheduler_manager.is_scheduler_active():
-            self.processor.data_manager.save_data()  # Save data if scheduler is not active
+        if persist:
+            self.persist_data()
 
         return ujson.dumps({"message": "OK"})
 
+    def persist_data(self):
+        """Saves the data store and any pending index changes unless the scheduler persists them periodically."""
+        if not self.processor.scheduler_manager.is_scheduler_active():
+            # Saves are written off the event loop and coalesced while a write is in flight
+            self.processor.data_manager.request_save()  # Save data if scheduler is not active
+            self.processor.indices_manager.request_save()  # Index updates are deferred to the same save
+
     async def del_command(self, args):
         """Handles the DEL command."""
-        commands = args.split('|')  # Split the commands by '|'
-        responses = []
-        sharding_active = await self.processor.sharding_manager.has_sharding()  # Check if sharding is active
-
-        for command in commands:
-            parts = command.strip().split(':')
-            if not parts or '' in parts:
-                responses.append("ERROR: Invalid DEL syntax")
+        commands = args.split('|') if '|' in args else (args,)  # Split the commands by '|', a single command needs no list
+        responses = [None] * len(commands)
+        pending = []  # Valid DEL commands, applied once every shard has been routed
+        sharding_active = self.processor.sharding_manager.has_sharding()  # Check if sharding is active
+
+        for position, command in enumerate(commands):
+            key = command.strip()
+            if not key or key[0] == ':' or key[-1] == ':' or '::' in key:  # Reject empty path segments before splitting
+                responses[position] = "ERROR: Invalid DEL syntax"
                 continue
+            parts = key.split(':')
             shard_key = ':'.join(parts[:2]) if len(parts) > 1 else parts[0]  # Get the sharding key
 
             if '*' in parts and sharding_active:
-                responses.append("ERROR: Wildcard deletions are not supported in sharding mode.")
+                responses[position] = "ERROR: Wildcard deletions are not supported in sharding mode."
                 continue
 
-            shard_result = await self.processor.sharding_manager.check_sharding('DEL', command, shard_key)  # Check sharding for DEL command
+            pending.append((position, command, parts, shard_key))
+
+        if sharding_active:
+            shard_results = await self.processor.sharding_manager.check_sharding_batch('DEL', [(entry[1], entry[3]) for entry in pending])
+        else:
+            shard_results = ['LOCAL'] * len(pending)
+
+        replicated_commands = []
+        for (position, command, parts, shard_key), shard_result in zip(pending, shard_results):
             if shard_result not in ["ERROR", "LOCAL"]:
-                responses.append(ujson.dumps({"message": "OK"}))
+                responses[position] = ujson.dumps({"message": "OK"})
                 continue
             elif shard_result == "ERROR":
-                responses.append(shard_result)
+                responses[position] = shard_result
                 continue
 
             if '*' in parts:
                 base_path = parts[:parts.index('*')]  # Get the base path
                 last_key = parts[-1]  # Get the last key
-                deleted_count = await self.delete_keys_wildcard(base_path, last_key, self.app_state.data_store)  # Delete keys with wildcard
-                responses.append(f"Deleted {deleted_count} entries.")
+                deleted_count = await self.delete_keys_wildcard(base_path, last_key, self.app_state.data_store, persist=False)  # Delete keys with wildcard
+                responses[position] = f"Deleted {deleted_count} entries."
             else:
-                response = await self.delete_specific_key(parts)  # Delete a specific key
-                responses.append(response)
+                responses[position] = await self.delete_specific_key(parts, persist=False)  # Delete a specific key
 
-            if await self.processor.replication_manager.has_replication_is_replication_master():
-                await self.processor.replication_manager.send_command_to_slaves(f"DEL {command}")  # Replicate the command to slaves
+            replicated_commands.append(command)
 
+        if replicated_commands and await self.processor.replication_manager.has_replication_is_replication_master():
+            await self.processor.replication_manager.queue_commands_to_slaves(f"DEL {command}" for command in replicated_commands)  # Replicate the commands to slaves, one command line per key
+
+        self.persist_data()  # Save once for the whole batch
         return '\n'.join(responses)
 
-    async def delete_keys_wildcard(self, base_path, last_key, data_store):
+    async def delete_keys_wildcard(self, base_path, last_key, data_store, persist=True):
         """Deletes keys using wildcard in the base path."""
-        def recursive_delete(current):
+        def iterative_delete(root):
+            # Walk the nested dicts with an explicit stack instead of one Python frame per level
             count = 0
-            if isinstance(current, dict):
-                for key in list(current.keys()):
-                    if key == last_key:
-                        del current[key]
-                        count += 1
-                    else:
-                        count += recursive_delete(current[key])
+            stack = [root]
+            while stack:
+                current = stack.pop()
+                if last_key in current:
+                    del current[last_key]  # Delete before descending so the remaining values are pushed as is
+                    count += 1
+                stack.extend(value for value in current.values() if isinstance(value, dict))
             return count
         current = data_store
         try:
             for key in base_path:
                 current = current[key]
-            deleted_count = recursive_delete(current)  # Recursively delete keys
+            deleted_count = iterative_delete(current) if isinstance(current, dict) else 0  # Delete the keys at every depth
             await self.processor.cache_handler.remove_from_cache(base_path)  # Invalidate cache entries
             self.app_state.data_has_changed = True
-            if not self.processor.scheduler_manager.is_scheduler_active():
-                self.processor.data_manager.save_data()  # Save data if scheduler is not active
+            if persist:
+                self.persist_data()
             return deleted_count
         except KeyError:
             return 0
 
-    async def delete_specific_key(self, parts):
+    async def delete_specific_key(self, parts, persist=True):
         """Deletes a specific key."""
         try:
             base_key = parts[0]
@@ -636,21 +757,22 @@ class DataCommandHandler:
             if key_to_delete in current_data:
                 value_to_remove = current_data[key_to_delete]
                 if isinstance(value_to_remove, dict):
-                    await self.processor.indices_manager.remove_entity_from_index(parts, value_to_remove)  # Remove entity from index
+                    await self.processor.indices_manager.remove_entity_from_index(parts, value_to_remove, persist=False)  # Remove entity from index
                 else:
                     if len(parts) > 3:
                         remove_field_parts = parts[:1] + parts[2:]
                     else:
                         remove_field_parts = parts
-                    await self.processor.indices_manager.remove_field_from_index(remove_field_parts[:-1], key_to_delete, value_to_remove)  # Remove field from index
+                    await self.processor.indices_manager.remove_field_from_index(remove_field_parts[:-1], key_to_delete, value_to_remove, persist=False)  # Remove field from index
 
                 del current_data[key_to_delete]  # Delete the key
-                self.processor.command_utils_manager.cleanup_empty_dicts(self.app_state.data_store, parts[:-1])  # Clean up empty dictionaries
+                if not current_data:  # Only an emptied parent can leave empty dictionaries behind
+                    self.processor.command_utils_manager.cleanup_empty_dicts(self.app_state.data_store, parts[:-1])  # Clean up empty dictionaries
 
                 self.app_state.data_has_changed = True
 
-                if not self.processor.scheduler_manager.is_scheduler_active():
-                    self.processor.data_manager.save_data()  # Save data if scheduler is not active
+                if persist:
+                    self.persist_data()
 
                 # Invalidate cache entries related to the base key
                 await self.processor.cache_handler.remove_from_cache(base_key)  # Invalidate cache entries
@@ -665,34 +787,63 @@ class DataCommandHandler:
 
     async def incr_decr_command(self, args, increment):
         """Handles the INCR and DECR commands."""
-        commands = args.split('|')  # Split the commands by '|'
-        responses = []
+        commands = args.split('|') if '|' in args else (args,)  # Split the commands by '|', a single command needs no list
+        responses = [None] * len(commands)
+        pending = []  # Valid INCR/DECR commands, applied once every shard has been routed
+        shard_command = 'INCR' if increment else 'DECR'
 
-        for command in commands:
+        for position, command in enumerate(commands):
             parts = command.strip().split()
             if len(parts) < 2:
-                responses.append("ERROR: Invalid syntax")
+                responses[position] = "ERROR: Invalid syntax"
                 continue
             keys = parts[0].split(':')
 
-            try:
-                amount = float(parts[1]) if '.' in parts[1] else int(parts[1])
-            except ValueError:
-                responses.append("ERROR: Invalid amount")
-                continue
+            amount_text = parts[1]
+            if amount_text.isdecimal() or (amount_text[:1] == '-' and amount_text[1:].isdecimal()):
+                amount = int(amount_text)  # Plain integers, the common counter case, cannot fail to parse
+            else:
+                try:
+                    amount = float(amount_text) if '.' in amount_text else int(amount_text)
+                except ValueError:
+                    responses[position] = "ERROR: Invalid amount"
+                    continue
 
             shard_key = f'{keys[0]}:{keys[1]}' if len(keys) > 1 else keys[0]  # Get the sharding key
-            shard_command = 'INCR' if increment else 'DECR'
-            shard_result = await self.processor.sharding_manager.check_sharding(shard_command, command.strip(), shard_key)  # Check sharding for INCR/DECR command
+            pending.append((position, command, parts[0], keys, amount, shard_key))
 
+        if self.processor.sharding_manager.has_sharding():
+            shard_results = await self.processor.sharding_manager.check_sharding_batch(shard_command, [(entry[1].strip(), entry[5]) for entry in pending])
+        else:
+            shard_results = ['LOCAL'] * len(pending)
+
+        data_store = self.app_state.data_store  # Bound once the shards have been routed, for every update below
+        command_utils = self.processor.command_utils_manager
+        notifications = {}  # Coalesced per key, the parent dicts are live so the last update wins
+        replicated_commands = []
+        for (position, command, key, keys, amount, shard_key), shard_result in zip(pending, shard_results):
             if shard_result != "ERROR" and shard_result != 'LOCAL':
-                responses.append(ujson.dumps({"message": "OK"}))
+                responses[position] = ujson.dumps({"message": "OK"})
                 continue
             elif shard_result == "ERROR":
-                responses.append(shard_result)
+                responses[position] = shard_result
                 continue
 
-            data = self.processor.command_utils_manager.get_nested_value(self.app_state.data_store, keys)  # Get the current value
+            # Walk the path once, creating missing levels, so the update is a single assignment on the parent
+            parent = data_store
+            for part in keys[:-1]:
+                child = parent.get(part)
+                if child is None:
+                    child = parent[part] = {}
+                elif not isinstance(child, dict):
+                    parent = None  # Lists and scalars on the path go through the generic helpers
+                    break
+                parent = child
+
+            if parent is not None:
+                data = parent.get(keys[-1])  # Get the current value
+            else:
+                data = command_utils.get_nested_value(data_store, keys)  # Get the current value
             if data is None:
                 data = 0
             original_type = float if isinstance(data, float) or isinstance(amount, float) else int
@@ -701,21 +852,22 @@ class DataCommandHandler:
             if original_type is int:
                 new_value = int(new_value)
 
-            new_data = self.processor.command_utils_manager.set_nested_value(self.app_state.data_store, keys, new_value)  # Set the new value
+            if parent is not None:
+                parent[keys[-1]] = new_value  # Set the new value
+            else:
+                parent = command_utils.set_nested_value(data_store, keys, new_value)  # Set the new value
+            notifications[key] = parent
+            responses[position] = ujson.dumps({"message": "OK"})
+            replicated_commands.append(command)
 
+        if replicated_commands:
             self.app_state.data_has_changed = True
-
-            if not self.processor.scheduler_manager.is_scheduler_active():
-                self.processor.data_manager.save_data()  # Save data if scheduler is not active
-
-            key = ":".join(keys)
-            await self.processor.sub_pub_manager.notify_subscribers(key, new_data)  # Notify subscribers
-            responses.append(ujson.dumps({"message": "OK"}))
+            await self.processor.sub_pub_manager.notify_subscribers_batch(notifications.items())  # Notify subscribers once per key
 
             if await self.processor.replication_manager.has_replication_is_replication_master():
-                replication_command = 'INCR' if increment else 'DECR'
-                await self.processor.replication_manager.send_command_to_slaves(f"{replication_command} {command}")  # Replicate the command to slaves
+                await self.processor.replication_manager.queue_commands_to_slaves(f"{shard_command} {command}" for command in replicated_commands)  # Replicate the commands to slaves, one command line per key
 
+        self.persist_data()  # Save once for the whole batch
         return '\n'.join(responses)
 
     async def rename_command(self, args):
@@ -728,7 +880,10 @@ class DataCommandHandler:
         new_key = new_key.strip()
         sharding_key = ':'.join(path_parts[:2]) if len(path_parts) > 1 else path_parts[0]  # Get the sharding key
 
-        shard_result = await self.processor.sharding_manager.check_sharding('RENAME', path, sharding_key)  # Check sharding for RENAME command
+        if self.processor.sharding_manager.has_sharding():
+            shard_result = await self.processor.sharding_manager.check_sharding('RENAME', path, sharding_key)  # Check sharding for RENAME command
+        else:
+            shard_result = 'LOCAL'  # Single node, nothing to route
         if shard_result != "ERROR" and shard_result != 'LOCAL':
             return ujson.dumps({"message": "OK"})
         elif shard_result == "ERROR":
@@ -738,27 +893,26 @@ class DataCommandHandler:
             base_path = path_parts[:path_parts.index('*')]  # Get the base path
             target_key = path_parts[-1]  # Get the target key
 
-            def recursive_rename(current, depth):
-                if depth == len(base_path):
-                    keys_renamed = 0
-                    for item in current.values():
-                        if target_key in item:
-                            item[new_key] = item.pop(target_key)
-                            keys_renamed += 1
-                    return keys_renamed
-                elif base_path[depth] in current:
-                    return recursive_rename(current[base_path[depth]], depth + 1)
-                return 0
+            def descend_and_rename(current):
+                for part in base_path:  # Walk the fixed prefix iteratively
+                    if not isinstance(current, dict) or part not in current:
+                        return 0
+                    current = current[part]
+                keys_renamed = 0
+                for item in current.values():
+                    if target_key in item:
+                        item[new_key] = item.pop(target_key)
+                        keys_renamed += 1
+                return keys_renamed
 
-            keys_renamed = recursive_rename(self.app_state.data_store, 0)  # Recursively rename keys
+            keys_renamed = descend_and_rename(self.app_state.data_store)  # Rename the keys under the wildcard
 
             self.app_state.data_has_changed = True
 
-            if not self.processor.scheduler_manager.is_scheduler_active():
-                self.processor.data_manager.save_data()  # Save data if scheduler is not active
+            self.persist_data()
 
             if await self.processor.replication_manager.has_replication_is_replication_master():
-                await self.processor.replication_manager.send_command_to_slaves(f"RENAME {command}")  # Replicate the command to slaves
+                await self.processor.replication_manager.queue_command_to_slaves(f"RENAME {command}")  # Replicate the command to slaves
 
             return f"RENAME successful: {keys_renamed} keys renamed." if keys_renamed else "Nothing to rename"
         else:
@@ -773,43 +927,53 @@ class DataCommandHandler:
                 current[new_key] = current.pop(path_parts[-1])  # Rename the key
                 self.app_state.data_has_changed = True
 
-                if not self.processor.scheduler_manager.is_scheduler_active():
-                    self.processor.data_manager.save_data()  # Save data if scheduler is not active
+                self.persist_data()
 
                 if await self.processor.replication_manager.has_replication_is_replication_master():
-                    await self.processor.replication_manager.send_command_to_slaves(f"RENAME {command}")  # Replicate the command to slaves
+                    await self.processor.replication_manager.queue_command_to_slaves(f"RENAME {command}")  # Replicate the command to slaves
                 return "RENAME successful: 1 key renamed."
             else:
                 return "ERROR: Key not found to rename."
 
     async def flush_all_command(self, *args, **kwargs):
         """Handles the FLUSHALL command."""
-        host = self.app_state.config_store.get('HOST')
-        port = self.app_state.config_store.get('PORT')
         self.app_state.data_store.clear()  # Clear the data store
         self.app_state.indices.clear()  # Clear the indices
-        self.processor.cache_handler.flush_cache  # Clear cached data
+        self.app_state.data_has_changed = True  # Record the flush so it is saved and cached KEYS results are dropped
+        self.app_state.indices_has_changed = True  # Record the flush so it is saved and memoized index lookups are dropped
+        await self.processor.cache_handler.flush_cache()  # Clear cached data
+        await self.processor.data_manager.wait_for_save()  # A background write of an older snapshot must not land after this save
+        await self.processor.indices_manager.wait_for_save()
         self.processor.data_manager.save_data()  # Save the data
         self.processor.indices_manager.save_indices()  # Save the indices
 
-        if await self.processor.sharding_manager.has_sharding_is_sharding_master():
-            shards = self.app_state.config_store.get('SHARDS')
-            shard_uris = [f"{shard}:{port}" for shard in shards if shard != host]  # Get the URIs of the shards
-            results = await self.processor.sharding_manager.broadcast_query('FLUSHALL', shard_uris)  # Broadcast FLUSHALL command to shards
+        if self.processor.sharding_manager.has_sharding_is_sharding_master():
+            shard_uris = self.processor.sharding_manager.get_shard_uris()  # Get the URIs of the shards
+            if shard_uris:  # The shards are flushed concurrently, skip the broadcast when there are none
+                await self.processor.sharding_manager.broadcast_query('FLUSHALL', shard_uris)  # Broadcast FLUSHALL command to shards
 
         return "All indices and data flushed successfully."
 
 class QueryCommandHandler:
+    __slots__ = ('app_state', 'processor', 'query_memo', 'query_memo_version')
+
     def __init__(self, processor):
         self.app_state = AppState()
         self.processor = processor  # Reference to the CommandProcessor
+        self.query_memo = {}  # Cache key -> local query results, in least recently used order
+        self.query_memo_version = None  # (data_version, indices_version) the memoized results were computed at
 
     async def batch_and_send_results(self, results, websocket, CHUNK_SIZE):
         """Batches the results into smaller chunks and sends them via WebSocket."""
         total_results = len(results)
-        for i in range(0, total_results, CHUNK_SIZE):
-            batch = results[i:i + CHUNK_SIZE]
-            await websocket.send(ujson.dumps(batch))
+        queue = asyncio.Queue(maxsize=8)  # Bounds the encoded chunks held in memory while the socket drains
+        sender = asyncio.create_task(self.processor.shard_handler.send_frames(websocket, queue))  # Sends in order while the next chunks are encoded
+        try:
+            for i in range(0, total_results, CHUNK_SIZE):
+                await queue.put(ujson.dumps(results[i:i + CHUNK_SIZE]))
+        finally:
+            await queue.put(None)  # Stop the sender once the queued chunks are sent
+            await sender
 
     async def query_command(self, args):
         """Handles the QUERY command."""
@@ -818,36 +982,29 @@ class QueryCommandHandler:
         parts = args.split(' ', 1)  # Split the arguments by space
         root = parts[0]  # Get the root key
         conditions = parts[1] if len(parts) > 1 else ""  # Get the conditions
-        sharding_active = await self.processor.sharding_manager.has_sharding()  # Check if sharding is active
+        sharding_active = self.processor.sharding_manager.has_sharding()  # Check if sharding is active
 
         # Check if the root key exists
         keys = root.split(':')
         
-        # Traverse the data_store dictionary to check if the nested key exists
-        data_store = self.app_state.data_store
+        # Traverse the data_store dictionary to check if the nested key exists, keeping the node for the local query
+        root_node = self.app_state.data_store
         for key in keys:
-            if key in data_store:
-                data_store = data_store[key]
+            if key in root_node:
+                root_node = root_node[key]
             else:
                 return "[]"  # Return an empty JSON array if any part of the key doesn't exist
 
         if 'JOIN' in conditions and sharding_active:
             return "JOIN operations are not supported in sharding mode."
-        modifiers, conditions = self.processor.command_utils_manager.parse_modifiers(conditions)  # Parse the modifiers
-        group_by_key = None
-        limit_values = None
-
-        if 'group_by' in modifiers:
-            group_by_key = modifiers['group_by']
-            conditions = conditions.replace(f"GROUPBY({group_by_key})", "").strip()
-
-        if 'limit' in modifiers:
-            limit_values = modifiers['limit']
-            limit_str = f"LIMIT({limit_values})" if isinstance(limit_values, str) else f"LIMIT({limit_values[0]},{limit_values[1]})"
-            conditions = conditions.replace(limit_str, "").strip()
+        if 'GROUPBY(' in conditions or 'ORDERBY(' in conditions or 'LIMIT(' in conditions:
+            modifiers, conditions = self.processor.command_utils_manager.parse_modifiers(conditions)  # Parse the modifiers, stripping every clause from the conditions
+        else:
+            modifiers = {}  # No modifiers present, skip the regex parsing
+            conditions = conditions.strip()
 
-        if not await self.processor.sharding_manager.has_sharding_is_sharding_master():
-            local_results = await self.process_local_query(root, conditions, modifiers)  # Process the query locally
+        if not (sharding_active and self.processor.sharding_manager.is_sharding_master()):
+            local_results = await self.process_local_query(root, conditions, modifiers, root_node)  # Process the query locally
 
             if isinstance(local_results, str):
                 return local_results
@@ -857,11 +1014,9 @@ class QueryCommandHandler:
 
             return ujson.dumps(local_results)
 
-        host = self.app_state.config_store.get('HOST')
-        port = self.app_state.config_store.get('PORT')
-        shard_uris = [f"{shard}:{port}" for shard in self.app_state.config_store.get('SHARDS') if shard != host]  # Get the URIs of the shards
+        shard_uris = self.processor.sharding_manager.get_shard_uris()  # Get the URIs of the shards
         remote_results = await self.processor.sharding_manager.broadcast_query(f'QUERY {root} {conditions}', shard_uris)  # Broadcast the query to shards
-        local_results = await self.process_local_query(root, conditions, modifiers)  # Process the query locally
+        local_results = await self.process_local_query(root, conditions, modifiers)  # Process the query locally, walking again since the store may have changed during the broadcast
 
         if isinstance(remote_results, list) and len(remote_results) == 1 and isinstance(remote_results[0], str):
             remote_results = remote_results[0]
@@ -878,17 +1033,37 @@ class QueryCommandHandler:
 
         return ujson.dumps(final_results)
 
-    async def process_local_query(self, root, conditions, modifiers=None):
-        """Processes a query locally."""
+    async def process_local_query(self, root, conditions, modifiers=None, preresolved=None):
+        """Processes a query locally, preresolved being the node at root when the caller already walked to it."""
         key_parts = root.split(':')
         main_key = key_parts[0]  # Get the main key
         specific_key = key_parts[1] if len(key_parts) > 1 else None  # Get the specific key
         sub_key_path = key_parts[2:] if len(key_parts) > 2 else []  # Get the sub-key path
+        if preresolved is not None and specific_key is None:
+            data_to_query = preresolved  # The root is the main key itself
+        else:
+            data_to_query = self.app_state.data_store.get(main_key, {})  # Get the data to query
+        if main_key not in self.app_state.data_store or data_to_query == {}:
+            return []  # Nothing stored under the main key, falsy values such as 0 or "" still go through
 
         # Check the cache first
-        command = f"QUERY {root} {conditions if conditions else ''} {modifiers if modifiers else ''}".strip() # Construct the full command for caching purposes
+        # Hashable cache key, the modifier values are plain strings and numbers so no string rendering is needed
+        command = (root, conditions, tuple(sorted(modifiers.items())) if modifiers else ())
+        caching = self.app_state.config_store.get('QUERY_CACHING') == '1'
+        if caching:
+            # Any write bumps a version, so memoized results are dropped as soon as the data or the indices change
+            memo_version = (self.app_state.data_version, self.app_state.indices_version)
+            if self.query_memo_version != memo_version:
+                self.query_memo.clear()
+                self.query_memo_version = memo_version
+            memo_result = self.query_memo.pop(command, None)
+            if memo_result is not None:
+                self.query_memo[command] = memo_result  # Move to the most recently used end
+                return memo_result
+
         cache_result = await self.processor.cache_handler.get_cache(command)
         if cache_result is not None:
+            self.remember_query(command, cache_result)
             return cache_result
 
         if conditions.startswith("WHERE "):
@@ -896,10 +1071,14 @@ class QueryCommandHandler:
 
         include_fields, exclude_fields, conditions = self.processor.command_utils_manager.parse_and_clean_fields(conditions)  # Parse and clean fields
         joins, conditions = self.processor.command_utils_manager.extract_join_clauses(conditions)  # Extract join clauses
-        data_to_query = self.app_state.data_store.get(main_key, {})  # Get the data to query
+        data_store = self.app_state.data_store  # Bind the stores once for the lookups below
+        indices = self.app_state.indices
 
         if specific_key:
-            specific_entry = data_to_query.get(specific_key)
+            if preresolved is not None and not sub_key_path:
+                specific_entry = preresolved  # The caller already resolved "main:specific"
+            else:
+                specific_entry = data_to_query.get(specific_key)
 
             if isinstance(specific_entry, dict) and sub_key_path:
                 for key in sub_key_path:
@@ -913,84 +1092,182 @@ class QueryCommandHandler:
 
             for join_table, join_key in joins:
                 join_value = str(specific_entry.get(join_key))
-                join_ids = self.app_state.indices.get(join_table, {}).get(join_key, {}).get(join_value, [])
-                joined_data = [
-                    {'key': jid.split(':')[1], **self.app_state.data_store[join_table][jid.split(':')[1]]}
-                    for jid in join_ids if jid.split(':')[1] in self.app_state.data_store[join_table]
-                ]
+                join_ids = indices.get(join_table, {}).get(join_key, {}).get(join_value, [])
+                table = data_store.get(join_table, {})
+                prefix_length = len(join_table) + 1  # Index ids are stored as "table:key"
+                join_ids = list(join_ids)
+                joined_data = []
+                for start in range(0, len(join_ids), _JOIN_PARTITION_SIZE):
+                    if start:
+                        await asyncio.sleep(0)  # Let other clients run between partitions of a large join
+                    join_keys = (jid[prefix_length:] for jid in join_ids[start:start + _JOIN_PARTITION_SIZE])  # Slice the key off instead of splitting the id
+                    joined_data += [{'key': key} | table[key] for key in join_keys if key in table]
                 specific_entry.setdefault(join_table, []).extend(joined_data)
 
-            results = self.processor.command_utils_manager.format_as_list(specific_entry)  # Format as list
+            results = specific_entry
 
         elif conditions:
-            results = self.processor.command_utils_manager.eval_conditions_using_indices(conditions, self.app_state.indices, main_key, joins)  # Evaluate conditions using indices
-            results = self.processor.command_utils_manager.format_as_list(results)  # Format as list
+            results = self.processor.command_utils_manager.eval_conditions_using_indices(conditions, indices, main_key, joins)  # Evaluate conditions using indices
         else:
-            results = self.processor.command_utils_manager.format_as_list(self.processor.data_manager.process_nested_data(data_to_query))  # Process nested data
+            results = self.processor.data_manager.process_nested_data(data_to_query)  # Process nested data
 
+        command_utils = self.processor.command_utils_manager
         if modifiers:
-            results = self.processor.command_utils_manager.apply_query_modifiers(results, modifiers)  # Apply query modifiers
+            # Grouping, sorting and slicing need the whole list before fields are filtered
+            rows = command_utils.apply_query_modifiers(command_utils.format_as_list(results), modifiers)  # Apply query modifiers
+        else:
+            rows = command_utils.format_as_iter(results)  # Rows are formatted and filtered in a single pass
 
-        results = [self.processor.command_utils_manager.filter_fields(entry, include_fields, exclude_fields) for entry in results]  # Filter fields
+        if include_fields or exclude_fields:
+            results = [command_utils.filter_fields(entry, include_fields, exclude_fields) for entry in rows]  # Filter fields
+        else:
+            results = rows if isinstance(rows, list) else list(rows)
 
         # Add the result to the cache
         if results:
             await self.processor.cache_handler.add_to_cache(command, root, results)
+            if caching:
+                self.remember_query(command, results)
 
         return results
 
+    def remember_query(self, command, results):
+        """Memoizes local query results, evicting the least recently used entry when full."""
+        if len(self.query_memo) >= _QUERY_MEMO_SIZE:
+            del self.query_memo[next(iter(self.query_memo))]
+        self.query_memo[command] = results
+
 class ShardCommandHandler:
+    __slots__ = ('app_state', 'processor')
+
     def __init__(self, processor):
         self.app_state = AppState()
         self.processor = processor  # Reference to the CommandProcessor
 
+    async def replicate_batch_command(self, commands):
+        """Handles the REPLICATE_BATCH command sent by a replication master, applying its commands in order."""
+        for command_line in commands:
+            command, args = self.processor.parse_command_line(command_line)
+            if command == 'SET':
+                await self.processor.data_handler._set_commands((args,))  # A replicated SET holds one key, its value may contain '|'
+            else:
+                await self.processor.process_command(command_line)  # Each command completes before the next one starts
+        return "OK"
+
     async def replicate_command(self, *args, **kwargs):
         """Handles the REPLICATE command."""
         websocket = self.app_state.websocket
 
         if await self.processor.replication_manager.has_replication_is_replication_master():
-            data = ujson.dumps(self.app_state.data_store)  # Get the data as a JSON string
-            indices = ujson.dumps(self.app_state.indices)  # Get the indices as a JSON string
-            CHUNK_SIZE = 1000
-            data_chunks = [data[i:i+CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]  # Split the data into chunks
-            indices_chunks = [indices[i:i+CHUNK_SIZE] for i in range(0, len(indices), CHUNK_SIZE)]  # Split the indices into chunks
-
-            for data_chunk in data_chunks:
-                await websocket.send(ujson.dumps({'data_chunks': [data_chunk], 'indices_chunks': []}))  # Send data chunks
-
-            for indices_chunk in indices_chunks:
-                await websocket.send(ujson.dumps({'data_chunks': [], 'indices_chunks': [indices_chunk]}))  # Send indices chunks
-
+            await self.send_json_stream(websocket, self.app_state.data_store, b'D')  # Send data chunks
+            await self.send_json_stream(websocket, self.app_state.indices, b'I')  # Send indices chunks
             await websocket.send('DONE')  # Send DONE signal
 
-    async def reshard_command(self, *args, **kwargs):
-        """Handles the RESHARD command."""
-        self.app_state.data_has_changed = True
-        self.app_state.indices_has_changed = True
+    def iter_json_pieces(self, obj, depth=1):
+        """Yields the UTF-8 JSON encoding of a dictionary entry by entry, descending depth levels into nested dictionaries."""
+        yield b'{'
+        separator = b''
+        for key, value in list(obj.items()):  # Snapshot the keys so sends can interleave with writes
+            if depth and isinstance(value, dict):
+                yield separator + self.encode_json(key) + b':'
+                yield from self.iter_json_pieces(value, depth - 1)  # Split large tables entry by entry
+            else:
+                yield separator + self.encode_json(key) + b':' + self.encode_json(value)
+            separator = b','
+        yield b'}'
 
-        self.processor.data_manager.save_data()  # Save the data
-        self.processor.indices_manager.save_indices()  # Save the indices
+    def encode_json(self, value):
+        """Encodes a value as compact UTF-8 JSON, leaving non-ASCII text unescaped."""
+        try:
+            # Index value sets are sent as lists
+            return ujson.dumps(value, ensure_ascii=False, escape_forward_slashes=False, default=list).encode()
+        except UnicodeEncodeError:
+            return ujson.dumps(value, default=list).encode()  # Lone surrogates can only be sent escaped
+
+    async def send_json_stream(self, websocket, obj, tag):
+        """Streams a dictionary as binary JSON chunks prefixed with a one byte tag, without building the whole string first."""
+        FRAME_SIZE = 1048576  # About 1 MB of payload per WebSocket frame
+        queue = asyncio.Queue(maxsize=8)  # Bounds the frames held in memory while the socket drains
+        sender = asyncio.create_task(self.send_frames(websocket, queue))  # Sends while the next frames are encoded
+        try:
+            frame = bytearray(tag)  # Pieces are encoded straight into the frame buffer, no join or prefix copies
+            for piece in self.iter_json_pieces(obj):
+                frame += piece
+                if len(frame) > FRAME_SIZE:
+                    # The slave concatenates the chunks of every frame before decoding
+                    await queue.put(frame)
+                    frame = bytearray(tag)
+            if len(frame) > 1:
+                await queue.put(frame)
+        finally:
+            await queue.put(None)  # Stop the sender once the queued frames are sent
+            await sender
+
+    async def send_frames(self, websocket, queue):
+        """Sends queued frames in order until a None sentinel is received."""
+        error = None
+        while (frame := await queue.get()) is not None:
+            if error is None:
+                try:
+                    await websocket.send(frame)
+                except Exception as e:
+                    error = e  # Keep draining so the producer never blocks on a full queue
+        if error is not None:
+            raise error
+
+    async def reshard_command(self, *args, websocket=None, **kwargs):
+        """Handles the RESHARD command."""
+        app_state = self.app_state
+        # The backup serializes the in-memory stores, so no save is needed before it
         self.processor.backup_manager.backup_data()  # Backup the data
 
-        if await self.processor.sharding_manager.is_sharding_master():
+        if self.processor.sharding_manager.is_sharding_master():
             return ujson.dumps(await self.processor.sharding_manager.reshard())  # Reshard if sharding master
-        else:
-            local_data = self.processor.data_manager.get_all_local_data()  # Get all local data
-            local_indices = self.processor.indices_manager.get_all_local_indices()  # Get all local indices
-
-            self.app_state.data_store.clear()  # Clear the data store
-            self.app_state.indices.clear()  # Clear the indices
-            self.app_state.data_has_changed = True
-            self.app_state.indices_has_changed = True
-
-            self.processor.data_manager.save_data()  # Save the data
-            self.processor.indices_manager.save_indices()  # Save the indices
-            prepared_data = self.processor.sharding_manager.prepare_data_for_transmission(local_data)  # Prepare data for transmission
-            prepared_indices = self.processor.sharding_manager.prepare_data_for_transmission(local_indices)  # Prepare indices for transmission
 
+        if websocket is None:
+            # No connection to stream on, answer with a single JSON document
             response = {
-                "local_data": prepared_data,
-                "local_indices": prepared_indices
+                "local_data": self.processor.sharding_manager.prepare_data_for_transmission(app_state.data_store),  # Prepare data for transmission
+                "local_indices": self.processor.sharding_manager.prepare_data_for_transmission(app_state.indices)  # Prepare indices for transmission
             }
+            app_state.data_store = {}  # Empty the data store
+            app_state.indices = {}  # Empty the indices
+            await self.save_local_stores()
+            return ujson.dumps(response)  # Return the response as a JSON string
+
+        # Hand the current stores over and start from empty ones, so writes made while streaming don't change
+        # what is sent; nothing is saved until the stores have been sent
+        local_data = app_state.data_store
+        local_indices = app_state.indices
+        app_state.data_store = {}
+        app_state.indices = {}
+        app_state.data_version += 1  # Drop cached KEYS and QUERY results
+        app_state.indices_version += 1  # Drop memoized index lookups
+
+        try:
+            # Stream the local stores to the master in tagged frames, as REPLICATE does, instead of building the whole response
+            await self.send_json_stream(websocket, local_data, b'D')  # Send data chunks
+            await self.send_json_stream(websocket, local_indices, b'I')  # Send indices chunks
+            await websocket.send('DONE')  # Send DONE signal
+        except Exception as e:
+            # Put the local stores back, keeping the keys written while streaming
+            local_data.update(app_state.data_store)
+            local_indices.update(app_state.indices)
+            app_state.data_store = local_data
+            app_state.indices = local_indices
+            app_state.data_version += 1
+            app_state.indices_version += 1
+            print(f"Failed to send the local stores to the sharding master: {e}")
+            return None
+
+        await self.save_local_stores()  # The stores now only hold what was written while streaming
+        return None
 
-            return ujson.dumps(response)  # Return the response as a JSON string
\ No newline at end of file
+    async def save_local_stores(self):
+        """Saves the data store and the indices once the previous ones have been handed to the sharding master."""
+        self.app_state.data_has_changed = True
+        self.app_state.indices_has_changed = True
+        await self.processor.data_manager.wait_for_save()  # A background write of an older snapshot must not land after this save
+        await self.processor.indices_manager.wait_for_save()
+        self.processor.data_manager.save_data()  # Save the data
+        self.processor.indices_manager.save_indices()  # Save the indices
\ No newline at end of file
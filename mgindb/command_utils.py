@@ -6,12 +6,89 @@ import random
 import decimal
 import string
 import hashlib
+import functools
+import operator
 import base64
 import zlib
 import uuid
 import fnmatch
 from .app_state import AppState
 
+# GROUPBY/ORDERBY/LIMIT clauses, matched and stripped in one pattern
+_QUERY_MODIFIER_RE = re.compile(r'(GROUPBY|ORDERBY|LIMIT)\(([^)]+)\)')
+# %name placeholders substituted from the expression context
+_PLACEHOLDER_RE = re.compile(r'%(\w+)')
+# Innermost function call of an expression, e.g. UPPER(abc)
+_FUNCTION_CALL_RE = re.compile(r"(\w+)\(([^()]*?)\)")
+# Splits conditions on AND/OR while keeping the operators
+_CONDITION_SPLIT_RE = re.compile(r'(\sAND\s|\sOR\s)')
+# Single "field op value" condition
+_CONDITION_RE = re.compile(r"([a-zA-Z0-9_:\[\]]+)\s*([=><!]+|LIKE)\s*['\"]?(.*?)['\"]?$", re.IGNORECASE)
+# Additional query arguments and the pattern stripping all of them
+_GROUPBY_ARG_RE = re.compile(r'GROUPBY\((.*?)\)')
+_ORDERBY_ARG_RE = re.compile(r'ORDERBY\((.*?),(ASC|DESC)\)')
+_LIMIT_ARG_RE = re.compile(r'LIMIT\((\d+)(,\d+)?\)')
+_ADDITIONAL_ARGS_RE = re.compile(r'GROUPBY\(.*?\)|ORDERBY\(.*?,(ASC|DESC)\)|LIMIT\(\d+(,\d+)?\)')
+# JOIN(collection,field) clauses
+_JOIN_RE = re.compile(r'JOIN\(\s*([^)]+)\s*\)')
+# EXPIRE(seconds) instruction appended to SET values
+_EXPIRE_RE = re.compile(r'EXPIRE\((\d+)\)')
+# Marks a condition path that does not exist in a row
+_MISSING = object()
+# Range comparisons whose expected value is converted to float when conditions are compiled
+_RANGE_OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+# First characters ujson accepts for a JSON document, including NaN and Infinity
+_JSON_START_CHARS = frozenset('{["-0123456789tfnNI')
+# Characters RANDOM(n) draws from
+_RANDOM_ALPHABET = string.ascii_letters + string.digits
+# CHECKSUM algorithms, looked up once instead of an elif chain
+_CHECKSUM_FUNCTIONS = {
+    'CRC32': lambda data: str(zlib.crc32(data)),  # Already unsigned in Python 3
+    'SHA1': lambda data: hashlib.sha1(data).hexdigest(),
+    'SHA256': lambda data: hashlib.sha256(data).hexdigest(),
+}
+
+
+@functools.lru_cache(maxsize=512)
+def _like_matcher(expected):
+    # LIKE patterns are compiled once per distinct pattern rather than once per scanned row
+    return re.compile(f"^{expected.lower().replace('%', '.*')}$").match
+
+
+@functools.lru_cache(maxsize=1024)
+def _split_path(path):
+    # Field paths repeat for every row of a query, so each one is split only once
+    return tuple(path.split(':'))
+
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_index_ids(conditions, main_key, indices_version):
+    # Memoized per indices version, so any index change makes stale entries miss
+    return frozenset(QueryUtil.match_index_ids(conditions, AppState().indices, main_key))
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_conditions(conditions):
+    # Same OR/AND splitting as eval_condition, with every part parsed up front
+    or_groups = []
+    for or_condition in conditions.split(' OR '):
+        and_group = []
+        for and_part in or_condition.strip().split(' AND '):
+            field, op, expected = QueryUtil.parse_condition(and_part.strip())
+            if field is None:
+                print("Condition parsing failed.")
+                and_group = None  # A group with an unparsable condition never matches
+                break
+            if op in _RANGE_OPERATORS:
+                try:
+                    expected = float(expected)
+                except ValueError:
+                    and_group = None  # A non-numeric bound never matches
+                    break
+            and_group.append((_split_path(field), op, expected))
+        or_groups.append(tuple(and_group) if and_group is not None else None)
+    return tuple(or_groups)
+
 
 class CommandUtilsManager:
     def __init__(self):
@@ -46,8 +123,8 @@ class CommandUtilsManager:
     def eval_conditions_using_indices(self, conditions, indices, main_key, joins=None):
         return self.query_util.eval_conditions_using_indices(conditions, indices, main_key, joins)
 
-    def process_joins(self, entry, join_table, join_key, indices):
-        return self.query_util.process_joins(entry, join_table, join_key, indices)
+    def process_joins(self, entry, join_table, join_key, indices, join_cache=None):
+        return self.query_util.process_joins(entry, join_table, join_key, indices, join_cache)
 
     def fallback_full_data_scan(self, main_key, conditions, joins=None):
         return self.query_util.fallback_full_data_scan(main_key, conditions, joins)
@@ -109,6 +186,9 @@ class CommandUtilsManager:
     def format_as_list(self, data):
         return self.data_util.format_as_list(data)
 
+    def format_as_iter(self, data):
+        return self.data_util.format_as_iter(data)
+
     def cleanup_empty_dicts(self, data, path):
         return self.data_util.cleanup_empty_dicts(data, path)
 
@@ -119,6 +199,9 @@ class JSONUtil:
         if isinstance(result, (dict, list)):  # If result is a dictionary or list, encode it as JSON
             return ujson.dumps(result)
         elif isinstance(result, str):
+            stripped = result.lstrip()
+            if not stripped or stripped[0] not in _JSON_START_CHARS:
+                return ujson.dumps(result)  # Plain messages like OK can't be JSON, skip the parse attempt
             try:
                 # Check if the string is already valid JSON
                 ujson.loads(result)
@@ -140,8 +223,7 @@ class ContextUtil:
 
     @staticmethod
     def replace_placeholders(arg, context):
-        placeholder_pattern = re.compile(r'%(\w+)')
-        matches = placeholder_pattern.findall(arg)
+        matches = _PLACEHOLDER_RE.findall(arg)
         for match in matches:
             if match in context:
                 arg = arg.replace(f'%{match}', str(context[match]))
@@ -156,12 +238,9 @@ class ExpressionUtil:
 
     def evaluate_expression(self, expr, context=None):
         context = context or {}
-        # Updated regex to find the innermost function call
-        func_pattern = re.compile(r"(\w+)\(([^()]*?)\)")
-
         while True:
             # Search for the innermost function call
-            match = func_pattern.search(expr)
+            match = _FUNCTION_CALL_RE.search(expr)
             if not match:
                 break
 
@@ -185,31 +264,17 @@ class ExpressionUtil:
             if func == "BASE64":
                 return base64.b64encode(arg.encode()).decode()
             elif func == "HASH":
-                hasher = hashlib.sha256()
-                hasher.update(arg.encode())
-                return hasher.hexdigest()
+                return hashlib.sha256(arg.encode()).hexdigest()  # One-shot digest of the short argument
             elif func == "MD5":
-                md5_hasher = hashlib.md5()
-                md5_hasher.update(arg.encode())
-                return md5_hasher.hexdigest()
+                return hashlib.md5(arg.encode()).hexdigest()
             elif func == "CHECKSUM":
                 algo, value = arg.split(',', 1)
-                algo = algo.strip().upper()
-                value = value.strip()
-                if algo == "CRC32":
-                    return str(zlib.crc32(value.encode()) & 0xffffffff)
-                elif algo == "SHA1":
-                    sha1_hasher = hashlib.sha1()
-                    sha1_hasher.update(value.encode())
-                    return sha1_hasher.hexdigest()
-                elif algo == "SHA256":
-                    sha256_hasher = hashlib.sha256()
-                    sha256_hasher.update(value.encode())
-                    return sha256_hasher.hexdigest()
-                else:
+                checksum_function = _CHECKSUM_FUNCTIONS.get(algo.strip().upper())
+                if checksum_function is None:
                     return "ERROR: Unsupported CHECKSUM algorithm"
+                return checksum_function(value.strip().encode())
             elif func == "RANDOM":
-                return ''.join(random.choices(string.ascii_letters + string.digits, k=int(arg)))
+                return ''.join(random.choices(_RANDOM_ALPHABET, k=int(arg)))
             elif func == "UPPER":
                 return arg.upper()
             elif func == "LOWER":
@@ -260,10 +325,34 @@ class QueryUtil:
 
     def eval_conditions_using_indices(self, conditions, indices, main_key, joins=None):
         joins = joins or []
+        if indices is self.app_state.indices:
+            # Memoized per indices version, so any index change makes stale entries miss
+            current_ids = _resolve_index_ids(conditions, main_key, self.app_state.indices_version)
+        else:
+            current_ids = self.match_index_ids(conditions, indices, main_key)
+
+        if not current_ids:
+            return self.fallback_full_data_scan(main_key, conditions, joins)
+
+        final_results = []
+        table = self.app_state.data_store[main_key]
+        prefix_length = len(main_key) + 1  # Index ids are stored as "table:key"
+        join_cache = {}  # Joined rows per join value, shared by all entries of this query
+        for data_id in current_ids:
+            data_id = data_id[prefix_length:]  # Slice the key off instead of splitting the id
+            if data_id in table:
+                entry = {'key': data_id} | table[data_id]
+                for join_table, join_key in joins:
+                    self.process_joins(entry, join_table, join_key, indices, join_cache)
+                final_results.append(entry)
+
+        return final_results
+
+    @staticmethod
+    def match_index_ids(conditions, indices, main_key):
         # Split the conditions by logical operators while keeping the operators
-        condition_parts = re.split(r'(\sAND\s|\sOR\s)', conditions)
-        results = []
-        current_ids = set()
+        condition_parts = _CONDITION_SPLIT_RE.split(conditions)
+        current_ids = None  # None until a condition has been resolved through an index
         current_logic = None
 
         for condition_part in condition_parts:
@@ -275,7 +364,10 @@ class QueryUtil:
             if not condition_part:
                 continue
 
-            field, operation, value = self.parse_condition(condition_part)
+            if current_logic == 'AND' and current_ids is not None and not current_ids:
+                continue  # An empty intersection stays empty, skip scanning this index
+
+            field, operation, value = QueryUtil.parse_condition(condition_part)
             if not field or not operation or value is None:
                 continue  # Skip invalid conditions
 
@@ -295,39 +387,33 @@ class QueryUtil:
             indexed_data = index_level['values']
             matching_ids = set()
 
-            if index_level['type'] == 'string':
-                for key, ids in indexed_data.items():
-                    if self.compare_values(key, operation, value):
-                        matching_ids.update(ids.split(','))
+            if operation == '=':
+                # Index values are string keys, so equality is a direct lookup instead of a scan
+                ids = indexed_data.get(value)
+                if isinstance(ids, str):
+                    matching_ids.add(ids)  # A string index maps each value to a single id
+                elif ids:
+                    matching_ids.update(ids)
+            elif index_level['type'] == 'string':
+                matching_ids.update(ids for key, ids in indexed_data.items() if QueryUtil.compare_values(key, operation, value))
             elif index_level['type'] == 'set':
                 for key, ids in indexed_data.items():
-                    if self.compare_values(key, operation, value):
+                    if QueryUtil.compare_values(key, operation, value):
                         matching_ids.update(ids)
 
-            if not current_ids:
+            if current_ids is None:
                 current_ids = matching_ids
-            else:
-                if current_logic == 'AND':
-                    current_ids &= matching_ids
-                elif current_logic == 'OR':
-                    current_ids |= matching_ids
+            elif current_logic == 'AND':
+                current_ids &= matching_ids
+            elif current_logic == 'OR':
+                current_ids |= matching_ids
 
-        if not current_ids:
-            return self.fallback_full_data_scan(main_key, conditions, joins)
+        return current_ids if current_ids is not None else set()
 
-        final_results = []
-        for data_id in current_ids:
-            data_id = data_id.split(':')[1]  # Ensure correct ID format
-            if data_id in self.app_state.data_store[main_key]:
-                entry = {'key': data_id, **self.app_state.data_store[main_key][data_id]}
-                for join_table, join_key in joins:
-                    self.process_joins(entry, join_table, join_key, indices)
-                final_results.append(entry)
-
-        return final_results
-
-    def process_joins(self, entry, join_table, join_key, indices):
+    def process_joins(self, entry, join_table, join_key, indices, join_cache=None):
         join_values = entry.get(join_key, [])
+        if join_cache is None:
+            join_cache = {}
 
         if not isinstance(join_values, list):
             join_values = [join_values]
@@ -336,21 +422,26 @@ class QueryUtil:
         processed_product_ids = set()
 
         if join_table in indices and join_key in indices[join_table]:
-            join_index_info = indices[join_table][join_key]
+            join_index_values = indices[join_table][join_key]['values']
+            table = self.app_state.data_store.get(join_table, {})
 
             for join_value in join_values:
-                join_value_str = str(join_value)
-                if join_value_str in join_index_info['values']:
-                    join_ids = join_index_info['values'][join_value_str]
-                    if isinstance(join_ids, str):
-                        join_ids = join_ids.split(',')
-
-                    for jid in join_ids:
-                        jid_key = jid.split(':')[-1]
-                        if jid_key in self.app_state.data_store[join_table] and jid_key not in processed_product_ids:
-                            product_entry = self.app_state.data_store[join_table][jid_key]
-                            joined_data.append(product_entry)
-                            processed_product_ids.add(jid_key)
+                cache_key = (join_table, join_key, str(join_value))
+                matches = join_cache.get(cache_key)
+                if matches is None:
+                    # Resolve each join value once per query, like the build side of a hash join
+                    join_ids = join_index_values.get(cache_key[2])
+                    if join_ids is None:
+                        join_ids = []  # No row of the joined table has this value
+                    elif isinstance(join_ids, str):
+                        join_ids = [join_ids]  # A string index maps each value to a single id
+                    matches = [(jid_key, table[jid_key]) for jid_key in (jid.rpartition(':')[2] for jid in join_ids) if jid_key in table]
+                    join_cache[cache_key] = matches
+
+                for jid_key, row in matches:
+                    if jid_key not in processed_product_ids:
+                        joined_data.append(row)
+                        processed_product_ids.add(jid_key)
 
         entry[join_table] = joined_data
         return entry
@@ -360,20 +451,53 @@ class QueryUtil:
         data_to_query = self.app_state.data_store.get(main_key, {})
 
         if isinstance(data_to_query, dict):
-            data_to_query = [{'key': k, **v} for k, v in data_to_query.items()]
-
-        filtered_results = self.eval_conditions(data_to_query, conditions)
+            # Conditions are compiled once and rows are only copied once they match
+            or_groups = _compile_conditions(conditions) if data_to_query else ()
+            filtered_results = [{'key': k} | v for k, v in data_to_query.items() if self.match_compiled_conditions(k, v, or_groups)]
+        else:
+            filtered_results = self.eval_conditions(data_to_query, conditions)
 
         final_results = []
+        join_cache = {}  # Joined rows per join value, shared by all entries of this query
         for entry in filtered_results:
             for join_table, join_key in joins:
-                self.process_joins(entry, join_table, join_key, self.app_state.indices)
+                self.process_joins(entry, join_table, join_key, self.app_state.indices, join_cache)
             final_results.append(entry)
 
         return final_results
 
+    def match_compiled_conditions(self, key, row, or_groups):
+        compare_values = self.compare_values
+        for and_group in or_groups:
+            if and_group is None:
+                continue
+            for parts, op, expected in and_group:
+                # The row is matched as it would be once materialized as {'key': key} | row
+                value = row.get(parts[0], _MISSING) if isinstance(row, dict) else _MISSING
+                if value is _MISSING and parts[0] == 'key':
+                    value = key
+                for part in parts[1:]:
+                    if value is _MISSING:
+                        break
+                    value = value.get(part, _MISSING) if isinstance(value, dict) else _MISSING
+                if value is _MISSING:
+                    break
+                if op in _RANGE_OPERATORS:
+                    try:
+                        matched = _RANGE_OPERATORS[op](float(value), expected)
+                    except ValueError:
+                        matched = False
+                else:
+                    matched = compare_values(value, op, expected)
+                if not matched:
+                    break
+            else:
+                return True
+        return False
+
     def eval_conditions(self, entries, conditions):
-        results = [entry for entry in entries if self.eval_condition(entry, conditions)]
+        or_groups = _compile_conditions(conditions) if entries else ()
+        results = [entry for entry in entries if self.match_compiled_conditions(_MISSING, entry, or_groups)]
         return results
 
     def eval_condition(self, entry, condition):
@@ -398,7 +522,7 @@ class QueryUtil:
 
         value = entry
         entry_key = entry.get('key', 'Unknown Key')  # Assumes each entry has a 'key' to identify it
-        for part in field.split(':'):
+        for part in _split_path(field):
             if isinstance(value, dict) and part in value:
                 value = value[part]
             else:
@@ -406,7 +530,8 @@ class QueryUtil:
 
         return self.compare_values(value, op, expected)
 
-    def compare_values(self, value, op, expected):
+    @staticmethod
+    def compare_values(value, op, expected):
         if op == 'BETWEEN':
             return expected[0] <= float(value) <= expected[1]
         elif op in ['=', '!=']:
@@ -423,9 +548,7 @@ class QueryUtil:
             except ValueError:
                 return False
         elif op == 'LIKE':
-            value, expected = str(value).lower(), str(expected).lower()
-            expected = expected.replace('%', '.*')
-            return bool(re.match(f"^{expected}$", value))
+            return bool(_like_matcher(str(expected))(str(value).lower()))
 
         op_functions = {
             '=': lambda v, e: v == e,
@@ -443,14 +566,14 @@ class QueryUtil:
             print(f"Unsupported operation {op}")
             return False
 
-    def parse_condition(self, condition):
+    @staticmethod
+    def parse_condition(condition):
         if 'BETWEEN' in condition:
             field, values = condition.split('BETWEEN', 1)
             lower_bound, upper_bound = values.split(',', 1)
             return field.strip(), 'BETWEEN', (float(lower_bound.strip()), float(upper_bound.strip()))
 
-        pattern = re.compile(r"([a-zA-Z0-9_:\[\]]+)\s*([=><!]+|LIKE)\s*['\"]?(.*?)['\"]?$", re.IGNORECASE)
-        match = pattern.match(condition)
+        match = _CONDITION_RE.match(condition)
         if match:
             field, op, value = match.groups()
             return field, op, value.strip("'\"")
@@ -459,9 +582,9 @@ class QueryUtil:
     def parse_additional_args(self, args):
         group_by, order_by, limit = None, None, None
 
-        group_match = re.search(r'GROUPBY\((.*?)\)', args)
-        order_match = re.search(r'ORDERBY\((.*?),(ASC|DESC)\)', args)
-        limit_match = re.search(r'LIMIT\((\d+)(,\d+)?\)', args)
+        group_match = _GROUPBY_ARG_RE.search(args)
+        order_match = _ORDERBY_ARG_RE.search(args)
+        limit_match = _LIMIT_ARG_RE.search(args)
 
         if group_match:
             group_by = group_match.group(1).strip()
@@ -472,7 +595,7 @@ class QueryUtil:
         if limit_match:
             limit = [int(x) for x in limit_match.groups() if x is not None]
 
-        clean_args = re.sub(r'GROUPBY\(.*?\)|ORDERBY\(.*?,(ASC|DESC)\)|LIMIT\(\d+(,\d+)?\)', '', args).strip()
+        clean_args = _ADDITIONAL_ARGS_RE.sub('', args).strip()
 
         return clean_args, group_by, order_by, limit
 
@@ -491,8 +614,7 @@ class QueryUtil:
     def filter_fields(self, data, include_fields=None, exclude_fields=None):
         def nested_get(data, path):
             """Get the value from a nested dictionary using a path."""
-            keys = path.split(':')
-            for key in keys:
+            for key in _split_path(path):
                 if not isinstance(data, dict):
                     return None
                 data = data.get(key, None)
@@ -500,7 +622,7 @@ class QueryUtil:
 
         def nested_set(data, path, value):
             """Set the value in a nested dictionary using a path."""
-            keys = path.split(':')
+            keys = _split_path(path)
             for key in keys[:-1]:
                 data = data.setdefault(key, {})
             data[keys[-1]] = value
@@ -534,19 +656,22 @@ class QueryUtil:
 
         def nested_filter(data, fields, include=True):
             """Filter the dictionary by including or excluding specified fields."""
+            if not fields and not include:
+                return data  # Nothing left to exclude below this level, keep the subtree as is
+
             result = {}
-            wildcard_fields = [field for field in fields if '*' in field]
+            # Wildcard fields split into their head pattern and remaining path once per level
+            wildcard_fields = [wf.partition(':')[::2] for wf in fields if '*' in wf]
 
             for key, value in data.items():
                 if isinstance(value, dict):
-                    sub_fields = [f[len(key)+1:] for f in fields if f.startswith(f"{key}:")]
+                    prefix = f"{key}:"
+                    sub_fields = [f[len(prefix):] for f in fields if f.startswith(prefix)]
                     result[key] = nested_filter(value, sub_fields, include)
 
                     # Apply wildcard exclusion/inclusion at the current level
-                    for wf in wildcard_fields:
-                        wf_parts = wf.split(':')
-                        if match_wildcard(wf_parts[0], key):
-                            sub_wf = ':'.join(wf_parts[1:])
+                    for wf_head, sub_wf in wildcard_fields:
+                        if match_wildcard(wf_head, key):
                             if sub_wf:
                                 result[key] = nested_filter(result.get(key, value), [sub_wf], include)
                             elif include:
@@ -575,8 +700,7 @@ class QueryUtil:
 
             # Process wildcard fields
             for wf in wildcard_fields:
-                wf_parts = wf.split(':')
-                apply_wildcards(data, result, wf_parts)
+                apply_wildcards(data, result, _split_path(wf))
 
             return result
 
@@ -595,7 +719,7 @@ class QueryUtil:
             'limit_start': 0,
             'limit_count': None
         }
-        matches = re.findall(r'(GROUPBY|ORDERBY|LIMIT)\(([^)]+)\)', conditions)
+        matches = _QUERY_MODIFIER_RE.findall(conditions)
         for match, value in matches:
             if match == 'GROUPBY':
                 modifiers['group_by'] = value
@@ -613,12 +737,12 @@ class QueryUtil:
                 elif len(limits) == 2:
                     modifiers['limit_start'], modifiers['limit_count'] = limits
 
-        cleaned_conditions = re.sub(r'(GROUPBY|ORDERBY|LIMIT)\([^)]+\)', '', conditions).strip()
+        cleaned_conditions = _QUERY_MODIFIER_RE.sub('', conditions).strip()
         return modifiers, cleaned_conditions
 
     def extract_join_clauses(self, conditions):
         joins = []
-        join_matches = re.findall(r'JOIN\(\s*([^)]+)\s*\)', conditions)
+        join_matches = _JOIN_RE.findall(conditions)
         for join_match in join_matches:
             join_parts = join_match.split(',')
             joins.append((join_parts[0].strip(), join_parts[1].strip()))
@@ -640,9 +764,19 @@ class QueryUtil:
 
         if 'order_by' in modifiers and modifiers['order_by']:
             target = grouped_results.values() if grouped_results else [combined_results]
+            order_by = modifiers['order_by']
+            reverse = not modifiers.get('order_asc', True)
             for group in target:
-                group.sort(key=lambda x: self.custom_sort_key(x, modifiers['order_by']),
-                           reverse=not modifiers.get('order_asc', True))
+                # Sort keys are computed once per row, and the custom_sort_key tuples are only
+                # needed when a group mixes strings, numbers and other values
+                values = [x.get(order_by, '') for x in group]
+                if all(isinstance(value, str) for value in values):
+                    keys = [value.lower() for value in values]
+                elif all(isinstance(value, (int, float)) for value in values):
+                    keys = values
+                else:
+                    keys = [self.custom_sort_key(x, order_by) for x in group]
+                group[:] = [group[i] for i in sorted(range(len(group)), key=keys.__getitem__, reverse=reverse)]
 
         limit_start = int(modifiers.get('limit_start', 0))
         limit_count = modifiers.get('limit_count')
@@ -723,33 +857,39 @@ class DataUtil:
 
     @staticmethod
     def format_as_list(data):
+        if isinstance(data, list):
+            return data
+        return list(DataUtil.format_as_iter(data))
+
+    @staticmethod
+    def format_as_iter(data):
+        # Yields the rows format_as_list would build, so callers can transform them in the same pass
         if isinstance(data, dict):
-            formatted_list = []
             for k, v in data.items():
                 if isinstance(v, dict):
                     if 'key' in v:
-                        formatted_list.append({**v})
+                        yield {**v}
                     else:
-                        formatted_list.append({'key': k, **v})
+                        yield {'key': k} | v
                 else:
-                    formatted_list.append({'key': k, 'value': v})
-            return formatted_list
+                    yield {'key': k, 'value': v}
         elif isinstance(data, list):
-            return data
-        elif data is None:
-            return []
-        else:
-            return [{'value': data}]
+            yield from data
+        elif data is not None:
+            yield {'value': data}
 
     @staticmethod
     def cleanup_empty_dicts(data, path):
-        for i in range(len(path) - 1, 0, -1):
-            current_level = data
-            for part in path[:i]:
-                current_level = current_level.get(part, None)
-                if current_level is None:
-                    return
+        # Walk down once collecting the parents, then prune empty levels bottom-up
+        parents = [data]
+        for part in path[:-1]:
+            current_level = parents[-1].get(part, None)
+            if current_level is None:
+                return
+            parents.append(current_level)
 
+        for i in range(len(path) - 1, 0, -1):
+            current_level = parents[i]
             if not current_level.get(path[i], {}):
                 del current_level[path[i]]
             else:
@@ -760,10 +900,10 @@ class DataUtil:
         expiry = None
 
         if isinstance(value, str):
-            expire_match = re.search(r'EXPIRE\((\d+)\)', value)
+            expire_match = _EXPIRE_RE.search(value)
             if expire_match:
                 expiry = time.time() + int(expire_match.group(1))
-                value = re.sub(r'EXPIRE\(\d+\)', '', value)
+                value = _EXPIRE_RE.sub('', value)
 
             if value.startswith('{') and value.endswith('}'):
                 try:
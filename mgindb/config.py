@@ -111,18 +111,22 @@ def load_config():
     with open(CONFIG_FILE, mode='w', encoding='utf-8') as file:
         ujson.dump(updated_config, file, indent=4)
 
+    app_state = AppState()  # Bound once for all the updates below
     # Update the application's configuration store with the loaded data
-    AppState().config_store.update(updated_config)
+    app_state.config_store.update(updated_config)
     # Set authentication data in the application state
-    AppState().auth_data = {
-        "username": AppState().config_store.get('USERNAME'),
-        "password": AppState().config_store.get('PASSWORD')
+    app_state.auth_data = {
+        "username": app_state.config_store.get('USERNAME'),
+        "password": app_state.config_store.get('PASSWORD')
     }
     # Validate 'REPLICATION_AUTHORIZED_SLAVES' and 'SHARDS' settings
-    if not isinstance(AppState().config_store.get('REPLICATION_AUTHORIZED_SLAVES', []), list):
-        AppState().config_store['REPLICATION_AUTHORIZED_SLAVES'] = []
-    if not isinstance(AppState().config_store.get('SHARDS', []), list):
-        AppState().config_store['SHARDS'] = []
+    if not isinstance(app_state.config_store.get('REPLICATION_AUTHORIZED_SLAVES', []), list):
+        app_state.config_store['REPLICATION_AUTHORIZED_SLAVES'] = []
+    if not isinstance(app_state.config_store.get('SHARDS', []), list):
+        app_state.config_store['SHARDS'] = []
+    # Mirror list-valued settings as sets for membership checks
+    app_state.config_sets = {key: set(app_state.config_store.get(key, [])) for key in ('REPLICATION_AUTHORIZED_SLAVES', 'SHARDS')}
+    app_state.config_version += 1  # Drop settings derived from the previous configuration
 
     return updated_config
 
@@ -134,5 +138,7 @@ def save_config():
     the configuration file (CONFIG_FILE) in JSON format. It uses an indentation
     level of 4 for readability.
     """
+    app_state = AppState()
+    app_state.config_version += 1  # Every runtime configuration change is saved through here
     with open(CONFIG_FILE, mode='w', encoding='utf-8') as file:
-        ujson.dump(AppState().config_store, file, indent=4)
+        ujson.dump(app_state.config_store, file, indent=4)
@@ -39,9 +39,15 @@ async def signal_stop():
     """
     print("Initiating shutdown...")
 
+    app_state = AppState()
+
     # Mark data and indices as changed
-    AppState().data_has_changed = True
-    AppState().indices_has_changed = True
+    app_state.data_has_changed = True
+    app_state.indices_has_changed = True
+
+    # Let the background saves finish before writing the same files
+    await data_manager.wait_for_save()
+    await indices_manager.wait_for_save()
 
     # Save changes to data, indices, and scheduler
     print("Saving data...")
@@ -60,21 +66,22 @@ async def signal_stop():
     # Handle replication shutdown for master and slave
     if await replication_manager.has_replication_is_replication_master():
         print("Stopping master replication...")
+        await replication_manager.wait_for_replication_queue()  # Send the commands still queued for the slaves
     
     if await replication_manager.has_replication_is_replication_slave():
         print("Stopping slave replication...")
 
     # Perform backup if enabled in configuration
-    if AppState().config_store.get('BACKUP_ON_SHUTDOWN') == "1":
+    if app_state.config_store.get('BACKUP_ON_SHUTDOWN') == "1":
         print("Initiating backup...")
         backup_response = await backup_manager.backup_data()
         print(backup_response)
 
     # Close all active WebSocket sessions
     print("Closing websocket sessions...")
-    session_keys = list(AppState().sessions.keys())
+    session_keys = list(app_state.sessions.keys())
     for sid in session_keys:
-        session = AppState().sessions.get(sid)
+        session = app_state.sessions.get(sid)
         if session and session['websocket'].open:
             await session['websocket'].close(code=1001, reason='Server shutdown')
 
@@ -1,5 +1,6 @@
 import ujson  # Module for JSON operations
 import os  # Module for interacting with the operating system
+import asyncio  # Module for asynchronous programming
 import time  # Module for time-related functions
 from .app_state import AppState  # Import application state management
 from .constants import DATA_FILE  # Import constant for data file path
@@ -29,6 +30,11 @@ class DataManager:
             with open(self.data_file, mode='r', encoding='utf-8') as file:
                 loaded_data = ujson.load(file)
             self.app_state.data_store.update(loaded_data)
+            self.app_state.data_version += 1  # Drop cached KEYS and QUERY results built from the previous data
+            # Cached query results were computed from the previous data and would refill the query memo
+            self.app_state.data_store_cache.clear()
+            self.app_state.data_store_cache_keys_expiration.clear()
+            self.app_state.data_store_key_command_mapping.clear()
         except ujson.JSONDecodeError as e:
             print(f"Failed to load data: {e}")
             return {}
@@ -48,6 +54,44 @@ class DataManager:
         except IOError as e:
             print(f"Failed to save data: {e}")
 
+    def request_save(self):
+        """
+        Save the data store in the background, coalescing the saves requested while one is running.
+        """
+        task = self.app_state.data_save_task
+        if task is None or task.done():
+            self.app_state.data_save_task = asyncio.create_task(self.save_data_in_background())
+
+    async def save_data_in_background(self):
+        """
+        Save the data store with the file write running in a worker thread.
+
+        The store is encoded on the event loop, so the snapshot is consistent, and saved
+        again if it changed while the previous snapshot was being written.
+        """
+        while self.app_state.data_has_changed:
+            payload = ujson.dumps(self.app_state.data_store, indent=4)
+            self.app_state.data_has_changed = False  # Changes made during the write flag the store again
+            try:
+                await asyncio.to_thread(self.write_data_file, payload)
+            except IOError as e:
+                print(f"Failed to save data: {e}")
+                self.app_state.data_has_changed = True  # The snapshot was not written, keep the store flagged
+                return
+
+    async def wait_for_save(self):
+        """
+        Wait for a running background save, so a synchronous save can't be overwritten by an older snapshot.
+        """
+        task = self.app_state.data_save_task
+        if task is not None and not task.done():
+            await task
+
+    def write_data_file(self, payload):
+        """Write an encoded data store to the data file."""
+        with open(self.data_file, mode='w', encoding='utf-8') as file:
+            file.write(payload)
+
     async def cleanup_expired_keys(self):
         """
         Asynchronously clean up expired keys from the data store.
@@ -62,6 +106,7 @@ class DataManager:
             key_parts = key.split(':')
             if self.nested_delete(self.app_state.data_store, key_parts):
                 del self.app_state.expires_store[key]
+                self.app_state.data_has_changed = True  # Persist the removal and drop cached KEYS results
                 # Check and possibly clean up parent keys
                 while len(key_parts) > 1:
                     key_parts.pop()  # Go up one level in the key hierarchy
@@ -1,5 +1,6 @@
 import ujson  # Module for JSON operations
 import os  # Module for interacting with the operating system
+import asyncio  # Module for asynchronous programming
 from .app_state import AppState  # Importing AppState class from app_state module
 from .constants import INDICES_FILE  # Importing INDICES_FILE constant from constants module
 from .replication_manager import ReplicationManager
@@ -31,6 +32,7 @@ class IndicesManager:
             try:
                 loaded_indices = ujson.load(file)
                 self.app_state.indices.update(self.deserialize_indices(loaded_indices))
+                self.app_state.indices_version += 1  # Invalidate memoized index lookups
             except ujson.JSONDecodeError:
                 self.app_state.indices.update({})
 
@@ -50,6 +52,44 @@ class IndicesManager:
         except IOError as e:
             print(f"Failed to save indices: {e}")
 
+    def request_save(self):
+        """
+        Save the indices in the background, coalescing the saves requested while one is running.
+        """
+        task = self.app_state.indices_save_task
+        if task is None or task.done():
+            self.app_state.indices_save_task = asyncio.create_task(self.save_indices_in_background())
+
+    async def save_indices_in_background(self):
+        """
+        Save the indices with the file write running in a worker thread.
+
+        The indices are encoded on the event loop, so the snapshot is consistent, and saved
+        again if they changed while the previous snapshot was being written.
+        """
+        while self.app_state.indices_has_changed:
+            payload = ujson.dumps(self.serialize_indices(self.app_state.indices), indent=4)
+            self.app_state.indices_has_changed = False  # Changes made during the write flag the indices again
+            try:
+                await asyncio.to_thread(self.write_indices_file, payload)
+            except IOError as e:
+                print(f"Failed to save indices: {e}")
+                self.app_state.indices_has_changed = True  # The snapshot was not written, keep the indices flagged
+                return
+
+    async def wait_for_save(self):
+        """
+        Wait for a running background save, so a synchronous save can't be overwritten by an older snapshot.
+        """
+        task = self.app_state.indices_save_task
+        if task is not None and not task.done():
+            await task
+
+    def write_indices_file(self, payload):
+        """Write encoded indices to the indices file."""
+        with open(self.indice_file, mode='w', encoding='utf-8') as file:
+            file.write(payload)
+
     def serialize_indices(self, data):
         """
         Serialize indices data to ensure it is JSON-compatible.
@@ -243,7 +283,7 @@ class IndicesManager:
                 return None
         return current_dict
 
-    async def update_index_on_add(self, parts, last_key, value, entity_key):
+    async def update_index_on_add(self, parts, last_key, value, entity_key, persist=True):
         """
         Update an index when a value is added.
 
@@ -252,15 +292,43 @@ class IndicesManager:
             last_key: The last key.
             value: The value to add.
             entity_key: The entity key.
+            persist: Whether to save the indices now or leave them flagged for the caller.
         """
-        from .scheduler import SchedulerManager
-        scheduler_manager = SchedulerManager()
+        if self.apply_index_add(parts, last_key, value, entity_key):
+            self.persist_indices(persist)
 
-        index_parts = self.construct_index_parts(parts, AppState().indices)
-        index_info = self.get_nested_index_info(AppState().indices, index_parts)
+    async def bulk_update_index_on_add(self, entries, persist=True):
+        """
+        Update indices for a batch of added values, persisting them once.
+
+        Args:
+            entries: A list of (parts, last_key, value, entity_key) tuples.
+            persist: Whether to save the indices now or leave them flagged for the caller.
+        """
+        changed = False
+        for parts, last_key, value, entity_key in entries:
+            changed = self.apply_index_add(parts, last_key, value, entity_key) or changed
+        if changed:
+            self.persist_indices(persist)
+
+    def apply_index_add(self, parts, last_key, value, entity_key):
+        """
+        Add a value to the matching index in memory.
+
+        Args:
+            parts: The parts of the key.
+            last_key: The last key.
+            value: The value to add.
+            entity_key: The entity key.
+
+        Returns:
+            bool: True if an index was updated, False otherwise.
+        """
+        index_parts = self.construct_index_parts(parts, self.app_state.indices)
+        index_info = self.get_nested_index_info(self.app_state.indices, index_parts)
 
         if not index_info or 'type' not in index_info:
-            return
+            return False
 
         index_type = index_info['type']
         values_dict = index_info.setdefault('values', {})
@@ -276,13 +344,9 @@ class IndicesManager:
                 values_dict[item] = set_for_item
         elif index_type == 'string':
             values_dict[str(value)] = entity_key
+        return True
 
-        if not scheduler_manager.is_scheduler_active():
-            self.save_indices()
-        else:
-            self.app_state.indices_has_changed = True
-
-    async def update_index_on_remove(self, parts, last_key, old_value, entity_key):
+    async def update_index_on_remove(self, parts, last_key, old_value, entity_key, persist=True):
         """
         Update an index when a value is removed.
 
@@ -291,15 +355,43 @@ class IndicesManager:
             last_key: The last key.
             old_value: The value to remove.
             entity_key: The entity key.
+            persist: Whether to save the indices now or leave them flagged for the caller.
         """
-        from .scheduler import SchedulerManager
-        scheduler_manager = SchedulerManager()
+        if self.apply_index_remove(parts, last_key, old_value, entity_key):
+            self.persist_indices(persist)
 
-        index_parts = self.construct_index_parts(parts, AppState().indices)
-        index_info = self.get_nested_index_info(AppState().indices, index_parts)
+    async def bulk_update_index_on_remove(self, entries, persist=True):
+        """
+        Update indices for a batch of removed values, persisting them once.
+
+        Args:
+            entries: A list of (parts, last_key, old_value, entity_key) tuples.
+            persist: Whether to save the indices now or leave them flagged for the caller.
+        """
+        changed = False
+        for parts, last_key, old_value, entity_key in entries:
+            changed = self.apply_index_remove(parts, last_key, old_value, entity_key) or changed
+        if changed:
+            self.persist_indices(persist)
+
+    def apply_index_remove(self, parts, last_key, old_value, entity_key):
+        """
+        Remove a value from the matching index in memory.
+
+        Args:
+            parts: The parts of the key.
+            last_key: The last key.
+            old_value: The value to remove.
+            entity_key: The entity key.
+
+        Returns:
+            bool: True if an index was updated, False otherwise.
+        """
+        index_parts = self.construct_index_parts(parts, self.app_state.indices)
+        index_info = self.get_nested_index_info(self.app_state.indices, index_parts)
 
         if not index_info or 'type' not in index_info:
-            return
+            return False
 
         index_type = index_info['type']
         values_dict = index_info['values']
@@ -322,11 +414,20 @@ class IndicesManager:
             for key, val in list(values_dict.items()):
                 if val == entity_key:
                     del values_dict[key]
+        return True
 
-        if not scheduler_manager.is_scheduler_active():
-            self.save_indices()
-        else:
-            self.app_state.indices_has_changed = True
+    def persist_indices(self, persist=True):
+        """
+        Flag the indices as changed and save them unless the scheduler is active.
+
+        Args:
+            persist: Whether to save now; pipelines pass False and save once at the end.
+        """
+        from .scheduler import SchedulerManager
+
+        self.app_state.indices_has_changed = True  # Also invalidates memoized index lookups
+        if persist and not SchedulerManager().is_scheduler_active():
+            self.request_save()  # Written off the event loop
 
     def construct_index_parts(self, parts, indices_structure):
         """
@@ -354,7 +455,7 @@ class IndicesManager:
 
         return index_parts
 
-    async def remove_field_from_index(self, keys, field, value_to_remove):
+    async def remove_field_from_index(self, keys, field, value_to_remove, persist=True):
         """
         Remove a specific field from an index.
 
@@ -362,13 +463,11 @@ class IndicesManager:
             keys: The keys of the index.
             field: The field to remove.
             value_to_remove: The value to remove.
+            persist: Whether to save the indices now or leave them flagged for the caller.
 
         Returns:
             The result of the removal.
         """
-        from .scheduler import SchedulerManager
-        scheduler_manager = SchedulerManager()
-
         if not keys:
             return "Error: No keys provided for index removal."
 
@@ -377,9 +476,9 @@ class IndicesManager:
         if is_nested:
             index_parts = keys + [field]
         else:
-            index_parts = self.construct_index_parts(keys[:-1], AppState().indices) + [field]
+            index_parts = self.construct_index_parts(keys[:-1], self.app_state.indices) + [field]
 
-        index_info = self.get_nested_index_info(AppState().indices, index_parts)
+        index_info = self.get_nested_index_info(self.app_state.indices, index_parts)
 
         if index_info:
             index_type = index_info.get('type', 'set')
@@ -398,35 +497,30 @@ class IndicesManager:
             else:
                 message = "Field not indexed or no matching entry found."
 
-            self.cleanup_empty_dicts(AppState().indices, index_parts)
-            if not scheduler_manager.is_scheduler_active():
-                self.save_indices()
-            else:
-                AppState().indices_has_changed = True
+            self.cleanup_empty_dicts(self.app_state.indices, index_parts)
+            self.persist_indices(persist)
             return message
         else:
             return "Field not indexed or index part not found."
 
-    async def remove_entity_from_index(self, keys, entity_data):
+    async def remove_entity_from_index(self, keys, entity_data, persist=True):
         """
         Remove an entity from an index.
 
         Args:
             keys: The keys of the entity.
             entity_data: The data of the entity.
+            persist: Whether to save the indices now or leave them flagged for the caller.
 
         Returns:
             The result of the removal.
         """
-        from .scheduler import SchedulerManager
-        scheduler_manager = SchedulerManager()
-
         if not keys:
             return "Error: No keys provided for entity index removal."
 
         main_key = keys[0]
         entity_key = f"{main_key}:{':'.join(keys[1:])}" if len(keys) > 1 else main_key
-        indices = AppState().indices.get(main_key, {})
+        indices = self.app_state.indices.get(main_key, {})
         message = "Entity index entries removed successfully."
 
         for field, field_info in indices.items():
@@ -451,10 +545,7 @@ class IndicesManager:
                         del values_dict[value]
                 self.cleanup_empty_dicts(indices, [main_key, field])
 
-        if not scheduler_manager.is_scheduler_active():
-            self.save_indices()
-        else:
-            AppState().indices_has_changed = True
+        self.persist_indices(persist)
 
         return message
 
@@ -468,9 +559,6 @@ class IndicesManager:
         Returns:
             The result of the creation.
         """
-        from .scheduler import SchedulerManager
-        scheduler_manager = SchedulerManager()
-
         parts = args.split()
         if len(parts) < 2:
             return "ERROR: Missing index name or type"
@@ -514,13 +602,10 @@ class IndicesManager:
                     attribute_value_str = str(attribute_value)
                     new_index['values'][attribute_value_str] = f"{main_key}:{key}"
 
-        if not scheduler_manager.is_scheduler_active():
-            self.save_indices()
-        else:
-            self.app_state.indices_has_changed = True
+        self.persist_indices()
 
         if await replication_manager.has_replication_is_replication_master():
-            await replication_manager.send_command_to_slaves(f"INDICES CREATE {args}")
+            await replication_manager.queue_command_to_slaves(f"INDICES CREATE {args}")
 
         return "OK"
 
@@ -536,9 +621,6 @@ class IndicesManager:
         Returns:
             The result of the update.
         """
-        from .scheduler import SchedulerManager
-        scheduler_manager = SchedulerManager()
-
         try:
             parts = [part.strip() for part in instruction.split(',')]
             field_and_keys = parts[0].split(':')
@@ -565,10 +647,7 @@ class IndicesManager:
                 current_level[actual_final_key] = set()
             current_level[actual_final_key].add(identifier_value)
 
-            if not scheduler_manager.is_scheduler_active():
-                self.save_indices()
-            else:
-                self.app_state.indices_has_changed = True
+            self.persist_indices()
 
             return "OK"
         except Exception as e:
@@ -585,9 +664,6 @@ class IndicesManager:
         Returns:
             The result of the deletion.
         """
-        from .scheduler import SchedulerManager
-        scheduler_manager = SchedulerManager()
-
         indices = self.app_state.indices
         parts = args.split()
         if len(parts) < 2:
@@ -619,13 +695,10 @@ class IndicesManager:
         else:
             return f"ERROR: Value {value_to_delete} not found under index {':'.join(keys)}"
 
-        if not scheduler_manager.is_scheduler_active():
-            self.save_indices()
-        else:
-            self.app_state.indices_has_changed = True
+        self.persist_indices()
 
-            if await replication_manager.has_replication_is_replication_master():
-                await replication_manager.send_command_to_slaves(f"INDICES DEL {args}")
+        if await replication_manager.has_replication_is_replication_master():
+            await replication_manager.queue_command_to_slaves(f"INDICES DEL {args}")
 
         return "OK"
 
@@ -639,17 +712,11 @@ class IndicesManager:
         Returns:
             The result of the flush.
         """
-        from .scheduler import SchedulerManager
-        scheduler_manager = SchedulerManager()
-
         indices = self.app_state.indices
         parts = args.split(':')
         if args in indices:
             del indices[args]
-            if not scheduler_manager.is_scheduler_active():
-                self.save_indices()
-            else:
-                self.app_state.indices_has_changed = True
+            self.persist_indices()
             return "OK"
         elif len(parts) > 1:
             indice_name = parts[0]
@@ -661,13 +728,10 @@ class IndicesManager:
                         del current[key]
                         if not current:
                             del indices[indice_name]
-                        if not scheduler_manager.is_scheduler_active():
-                            self.save_indices()
-                        else:
-                            self.app_state.indices_has_changed = True
+                        self.persist_indices()
 
                         if await replication_manager.has_replication_is_replication_master():
-                            await replication_manager.send_command_to_slaves(f"INDICES FLUSH {args}")
+                            await replication_manager.queue_command_to_slaves(f"INDICES FLUSH {args}")
 
                         return "OK"
                     else:
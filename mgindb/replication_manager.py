@@ -4,6 +4,9 @@ import os  # Module for interacting with the operating system
 from .app_state import AppState  # Importing AppState class from app_state module
 from .connection_handler import asyncio, websockets  # Importing asyncio and websockets from connection_handler module
 
+REPLICATION_QUEUE_SIZE = 10000  # Commands held for the slaves before writers wait for the queue to drain
+REPLICATION_BATCH_SIZE = 256  # Queued commands sent over a single connection per slave
+
 class ReplicationManager:
     def __init__(self):
         """Initialize ReplicationManager with application state."""
@@ -70,7 +73,8 @@ class ReplicationManager:
         """
         master_uri = self.app_state.config_store.get('REPLICATION_MASTER')
         try:
-            async with websockets.connect(f'ws://{master_uri}') as websocket:
+            # Replication frames are about 1 MB, so lift the default 1 MiB message limit and keep permessage-deflate on
+            async with websockets.connect(f'ws://{master_uri}', max_size=None, compression='deflate') as websocket:
                 await websocket.send(ujson.dumps(self.app_state.auth_data))  # Send authentication data
                 auth_response = await websocket.recv()
                 if 'Welcome!' in auth_response:
@@ -79,17 +83,29 @@ class ReplicationManager:
                     # Initialize empty lists to accumulate chunks
                     data_chunks = []
                     indices_chunks = []
+                    # Binary frames are collected in one buffer per store, so each store is decoded once
+                    buffers = {b'D': bytearray(), b'I': bytearray()}
 
                     # Keep receiving data until a 'done' message is received
                     while True:
                         chunk = await websocket.recv()
                         if chunk == 'DONE':
                             break
+                        elif isinstance(chunk, bytes):
+                            # Binary frames carry raw JSON prefixed with b'D' (data) or b'I' (indices)
+                            buffer = buffers.get(chunk[:1])
+                            if buffer is not None:
+                                buffer += memoryview(chunk)[1:]  # Skip the tag without copying the frame
                         else:
                             chunk_data = ujson.loads(chunk)
                             data_chunks.extend(chunk_data['data_chunks'])
                             indices_chunks.extend(chunk_data['indices_chunks'])
 
+                    if buffers[b'D']:
+                        data_chunks.append(buffers[b'D'].decode())
+                    if buffers[b'I']:
+                        indices_chunks.append(buffers[b'I'].decode())
+
                     # After all chunks are received, process them
                     print("Replication chunks received. Processing data...")
                     await self.process_replication_data({'data_chunks': data_chunks, 'indices_chunks': indices_chunks}, scheduler_manager, data_manager, indices_manager)
@@ -123,6 +139,8 @@ class ReplicationManager:
             self.app_state.data_has_changed = True
             self.app_state.indices_has_changed = True
             if not scheduler_manager.is_scheduler_active():
+                await data_manager.wait_for_save()  # A background write of an older snapshot must not land after this save
+                await indices_manager.wait_for_save()
                 data_manager.save_data()  # Save data if scheduler is not active
                 indices_manager.save_indices()  # Save indices if scheduler is not active
 
@@ -130,6 +148,61 @@ class ReplicationManager:
         except ujson.JSONDecodeError as e:
             print(f"Error decoding replication data: {e}")
 
+    async def queue_command_to_slaves(self, command):
+        """
+        Queue a command for all replication slaves without waiting for them to receive it.
+
+        Commands reach the slaves in the order they are queued. Writers only wait when the queue is full.
+
+        Args:
+            command (str): The command to send.
+        """
+        app_state = self.app_state
+        if app_state.replication_queue is None:
+            app_state.replication_queue = asyncio.Queue(maxsize=REPLICATION_QUEUE_SIZE)
+        await app_state.replication_queue.put(command)
+        if app_state.replication_task is None or app_state.replication_task.done():
+            app_state.replication_task = asyncio.create_task(self.drain_replication_queue())
+
+    async def queue_commands_to_slaves(self, commands):
+        """
+        Queue several commands for all replication slaves, each as its own command line.
+
+        Args:
+            commands (iterable): The commands to send.
+        """
+        for command in commands:
+            await self.queue_command_to_slaves(command)
+
+    async def drain_replication_queue(self):
+        """
+        Send the queued commands to the slaves, batching the commands that piled up meanwhile.
+
+        A batch that fails to send is logged per slave and dropped, so the commands queued after it are still sent.
+        """
+        queue = self.app_state.replication_queue
+        while not queue.empty():
+            commands = [queue.get_nowait()]
+            while len(commands) < REPLICATION_BATCH_SIZE and not queue.empty():
+                commands.append(queue.get_nowait())
+            slave_uris = self.app_state.config_store.get('REPLICATION_SLAVES')  # Same list send_commands_to_slaves reads, the results follow its order
+            try:
+                results = await self.send_commands_to_slaves(commands)
+            except Exception as e:
+                print(f"Failed to replicate {len(commands)} commands: {e}")
+                continue
+            for slave_uri, result in zip(slave_uris, results):
+                if result != "OK":
+                    print(f"Failed to replicate {len(commands)} commands to {slave_uri}: {result}")
+
+    async def wait_for_replication_queue(self):
+        """
+        Wait until every queued command has been sent to the slaves.
+        """
+        task = self.app_state.replication_task
+        if task is not None and not task.done():
+            await task
+
     async def send_command_to_slaves(self, command):
         """
         Send a command to all replication slaves.
@@ -137,6 +210,20 @@ class ReplicationManager:
         Args:
             command (str): The command to send.
 
+        Returns:
+            list: The results from each slave.
+        """
+        return await self.send_commands_to_slaves([command])
+
+    async def send_commands_to_slaves(self, commands):
+        """
+        Send several commands to all replication slaves as one REPLICATE_BATCH message per slave.
+
+        The slave applies the commands of a batch one after the other, so they keep their order.
+
+        Args:
+            commands (list): The commands to send.
+
         Returns:
             list: The results from each slave.
         """
@@ -146,13 +233,14 @@ class ReplicationManager:
                     await websocket.send(ujson.dumps(self.app_state.auth_data))  # Send authentication data
                     auth_response = await websocket.recv()
                     if 'Welcome!' in auth_response:
-                        await websocket.send(command)  # Send the command
+                        await websocket.send(batch)  # Send the commands
                         return "OK"
                     else:
                         return f"Authentication failed at {slave_uri}."
             except Exception as e:
                 return f"Failed to send command to {slave_uri}: {str(e)}"
 
+        batch = f"REPLICATE_BATCH {ujson.dumps(commands, ensure_ascii=False)}"  # Encoded once for every slave
         slave_uris = self.app_state.config_store.get('REPLICATION_SLAVES')  # Get the list of slave URIs
         tasks = [send_command_to_slave(slave_uri) for slave_uri in slave_uris]  # Create tasks for each slave
         results = await asyncio.gather(*tasks)  # Gather results from all tasks
@@ -119,6 +119,8 @@ class SchedulerTasks:
             # Tasks
             save_timer += 1
             if save_timer >= save_interval:
+                await data_manager.wait_for_save()  # A background write of an older snapshot must not land after this save
+                await indices_manager.wait_for_save()
                 data_manager.save_data()
                 indices_manager.save_indices()
                 if await blockchain_manager.has_blockchain():
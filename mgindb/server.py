@@ -124,6 +124,11 @@ class ServerManager:
         shutdown the server.
         """
         try:
+            # Start new tasks eagerly, so commands that complete without blocking skip a pass through the scheduler (Python 3.12+)
+            eager_task_factory = getattr(asyncio, 'eager_task_factory', None)
+            if eager_task_factory:
+                asyncio.get_running_loop().set_task_factory(eager_task_factory)
+
             # Load components
             await self.load_components()
 
@@ -132,7 +137,7 @@ class ServerManager:
             host = self.app_state.config_store.get('HOST')  # Get host from config
             port = self.app_state.config_store.get('PORT')  # Get port from config
             
-            await websockets.serve(self.websocket_manager.handle_websocket, host, port, max_size=None)  # Start the WebSocket server
+            await websockets.serve(self.websocket_manager.handle_websocket, host, port, max_size=None, compression='deflate')  # Start the WebSocket server
             print(f"WebSocket serving on {host}:{port}")  # Print message with WebSocket server details
 
             # Start Blockchain Websocket connection to the master node if has blockchain
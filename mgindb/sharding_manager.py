@@ -11,16 +11,17 @@ class ShardingManager:
         self.app_state = AppState()
         self.data_manager = DataManager()
         self.indices_manager = IndicesManager()
+        self.shard_uris_cache = None  # (config_version, shard URIs) of the last get_shard_uris call
 
-    async def has_sharding(self):
+    def has_sharding(self):
         """Check if sharding is enabled in the configuration."""
         return self.app_state.config_store.get('SHARDING') == '1'
 
-    async def is_sharding_master(self):
+    def is_sharding_master(self):
         """Check if the current node is a sharding master."""
         return self.app_state.config_store.get('SHARDING_TYPE') == 'MASTER'
 
-    async def has_sharding_is_sharding_master(self):
+    def has_sharding_is_sharding_master(self):
         """Check if sharding is enabled and the current node is a sharding master."""
         sharding_type = self.app_state.config_store.get('SHARDING_TYPE')
         sharding = self.app_state.config_store.get('SHARDING')
@@ -58,6 +59,51 @@ class ShardingManager:
         except Exception as e:
             return f"ERROR: {str(e)}"
 
+    def get_shard_uris(self):
+        """
+        Get the URIs of the other shards, rebuilt only when the configuration changes.
+        
+        Returns:
+            tuple: The "shard:port" URI of every shard except this host.
+        """
+        config_version = self.app_state.config_version
+        if self.shard_uris_cache is None or self.shard_uris_cache[0] != config_version:
+            host = self.app_state.config_store.get('HOST')
+            port = self.app_state.config_store.get('PORT')
+            shard_uris = tuple(f"{shard}:{port}" for shard in self.app_state.config_store.get('SHARDS', []) if shard != host)
+            self.shard_uris_cache = (config_version, shard_uris)
+        return self.shard_uris_cache[1]
+
+    async def check_sharding_batch(self, command, requests):
+        """
+        Route several commands at once, keeping the order of the commands sent to each shard.
+        
+        Parameters:
+            command (str): The command to execute.
+            requests (list): The (command_line, key) pair of each command.
+        
+        Returns:
+            list: The check_sharding result of each command, in the order of the requests.
+        """
+        results = [None] * len(requests)
+        positions_by_shard = {}
+        for position, (command_line, key) in enumerate(requests):
+            try:
+                shard = self.get_shard(key)
+            except Exception as e:
+                results[position] = f"ERROR: {str(e)}"
+                continue
+            positions_by_shard.setdefault(shard, []).append(position)
+
+        async def route_to_shard(positions):
+            for position in positions:
+                command_line, key = requests[position]
+                results[position] = await self.check_sharding(command, command_line, key)
+
+        # Commands for one shard go out one after another, different shards are contacted concurrently
+        await asyncio.gather(*(route_to_shard(positions) for positions in positions_by_shard.values()))
+        return results
+
     def get_shard(self, key):
         """
         Determine the shard for a given key.
@@ -181,15 +227,31 @@ class ShardingManager:
         responsive_shards = []
         for uri in shard_uris:
             try:
-                async with websockets.connect(f'ws://{uri}') as websocket:
+                # Shards stream their stores in frames of about 1 MB, so lift the default 1 MiB message limit
+                async with websockets.connect(f'ws://{uri}', max_size=None, compression='deflate') as websocket:
                     await websocket.send(ujson.dumps(self.app_state.auth_data))
                     auth_response = await websocket.recv()
                     if 'Welcome!' in auth_response:
                         await websocket.send(command)
-                        response = await websocket.recv()
-                        response_data = ujson.loads(response)
-                        data = response_data.get('local_data', {})
-                        indices = response_data.get('local_indices', {})
+                        # Binary frames are collected in one buffer per store, so each store is decoded once
+                        buffers = {b'D': bytearray(), b'I': bytearray()}
+                        while True:
+                            chunk = await websocket.recv()
+                            if chunk == 'DONE':
+                                data = ujson.loads(buffers[b'D'].decode()) if buffers[b'D'] else {}
+                                indices = ujson.loads(buffers[b'I'].decode()) if buffers[b'I'] else {}
+                                break
+                            elif isinstance(chunk, bytes):
+                                # Binary frames carry raw JSON prefixed with b'D' (data) or b'I' (indices)
+                                buffer = buffers.get(chunk[:1])
+                                if buffer is not None:
+                                    buffer += memoryview(chunk)[1:]  # Skip the tag without copying the frame
+                            else:
+                                # Shards running an older version answer with a single JSON document
+                                response_data = ujson.loads(chunk)
+                                data = response_data.get('local_data', {})
+                                indices = response_data.get('local_indices', {})
+                                break
                         results.append((data, indices))
                         responsive_shards.append(uri.split(':')[0])
                     else:
@@ -231,6 +293,8 @@ class ShardingManager:
 
             self.app_state.data_has_changed = True
             self.app_state.indices_has_changed = True
+            await self.data_manager.wait_for_save()  # A background write of an older snapshot must not land after this save
+            await self.indices_manager.wait_for_save()
             self.data_manager.save_data()
             self.indices_manager.save_indices()
 
@@ -285,6 +349,7 @@ class ShardingManager:
             if sharding == '0':
                 self.app_state.indices = indices
                 self.app_state.indices_has_changed = True
+                await self.indices_manager.wait_for_save()  # A background write of an older snapshot must not land after this save
                 self.indices_manager.save_indices()
             else:
                 await process_indices(indices)
@@ -311,6 +376,7 @@ class ShardingManager:
             if sharding == '0':
                 self.app_state.data_store = data
                 self.app_state.data_has_changed = True
+                await self.data_manager.wait_for_save()  # A background write of an older snapshot must not land after this save
                 self.data_manager.save_data()
             else:
                 shard_commands = {}
@@ -97,6 +97,51 @@ class Notifier:
             key (str): The key to notify about.
             data (dict): The data to send.
         """
+        subscribers = self.get_key_subscribers(key)
+
+        message = ujson.dumps({
+            "key": key,
+            "data": data
+        })
+
+        for sid in subscribers:
+            await self.send_websocket_message(sid, message)
+
+    async def notify_subscribers_batch(self, keys_and_data):
+        """
+        Notify the subscribers of several keys, skipping the lookup entirely when nothing is subscribed.
+
+        Each key is still sent to each of its subscribers as its own message.
+
+        Args:
+            keys_and_data (list): List of (key, data) tuples to notify about.
+        """
+        if not self.app_state.sub_pub:
+            return  # Nobody is subscribed to any key
+
+        for key, data in keys_and_data:
+            subscribers = self.get_key_subscribers(key)
+            if not subscribers:
+                continue
+
+            message = ujson.dumps({
+                "key": key,
+                "data": data
+            })
+
+            for sid in subscribers:
+                await self.send_websocket_message(sid, message)
+
+    def get_key_subscribers(self, key):
+        """
+        Collect the subscribers of a key, including wildcard subscriptions.
+
+        Args:
+            key (str): The key to match.
+
+        Returns:
+            set: Session IDs subscribed to the key.
+        """
         key_parts = key.split(':')
         wildcard_keys = [":".join(key_parts[:i]) + ':*' for i in range(1, len(key_parts) + 1)]
         deeper_wildcards = [":".join(key_parts[:i]) + ':*:*' for i in range(1, len(key_parts))]
@@ -108,14 +153,7 @@ class Notifier:
 
         if key in self.app_state.sub_pub:
             subscribers.update(self.app_state.sub_pub[key])
-
-        message = ujson.dumps({
-            "key": key,
-            "data": data
-        })
-
-        for sid in subscribers:
-            await self.send_websocket_message(sid, message)
+        return subscribers
 
     async def notify_node(self, type, data, request_id=None, node_type='ALL', sid=None):
         """
@@ -246,6 +284,15 @@ class SubPubManager:
         keys = [key.strip() for key in args.split(',')]
         return self.subscriptions.unsubscribe(keys, sid)
 
+    def has_subscribers(self):
+        """
+        Check whether any session is subscribed to a key.
+
+        Returns:
+            bool: True if at least one key subscription exists.
+        """
+        return bool(self.app_state.sub_pub)
+
     async def notify_monitors(self, command_line, sid):
         """
         Notify all monitor subscribers of a command.
@@ -266,6 +313,15 @@ class SubPubManager:
         """
         await self.notifier.notify_subscribers(key, data)
 
+    async def notify_subscribers_batch(self, keys_and_data):
+        """
+        Notify the subscribers of several keys, each key as its own message.
+
+        Args:
+            keys_and_data (list): List of (key, data) tuples to notify about.
+        """
+        await self.notifier.notify_subscribers_batch(keys_and_data)
+
     async def notify_node(self, type, data, request_id=None, node_type='ALL', sid=None):
         """
         Notify node subscribers with the transaction data.
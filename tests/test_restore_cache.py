@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import ujson
+
+from mgindb import backup_manager
+from mgindb.app_state import AppState
+from mgindb.config import get_default_config
+from mgindb.command_processing import CommandProcessor
+
+
+class RestoreInvalidatesCachedResultsTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+        app_state = AppState()
+        config = get_default_config()
+        config['SCHEDULER'] = '1'  # Keep saves out of the way, only the reload is under test
+        config['QUERY_CACHING'] = '1'
+        app_state.config_store.update(config)
+        app_state.data_store.clear()
+        app_state.indices.clear()
+
+        self.processor = CommandProcessor(None, None, None)
+
+        # RESTORE copies the backup over the data file and reloads it, point both at the temporary directory
+        data_file = os.path.join(self.tmp_dir, 'data.json')
+        for patcher in (
+            mock.patch.object(backup_manager, 'BACKUP_DIR', self.tmp_dir),
+            mock.patch.object(backup_manager.data_manager, 'data_file', data_file),
+            mock.patch.object(self.processor.backup_manager, 'data_file', data_file),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_backup(self, filename, data):
+        with open(os.path.join(self.tmp_dir, filename), mode='w', encoding='utf-8') as file:
+            ujson.dump(data, file)
+
+    async def test_query_after_restore(self):
+        await self.processor.process_command('SET users:1 {"name":"Alice"}')
+        self.assertEqual(ujson.loads(await self.processor.process_command('QUERY users WHERE name = Alice')), [{'key': '1', 'name': 'Alice'}])
+        self.assertEqual(ujson.loads(await self.processor.process_command('QUERY users WHERE name = Bob')), [])
+
+        self.write_backup('data_restore.json', {'users': {'1': {'name': 'Bob'}}})
+        await self.processor.process_command('BACKUP RESTORE data_restore.json')
+
+        self.assertEqual(ujson.loads(await self.processor.process_command('QUERY users WHERE name = Alice')), [])
+        self.assertEqual(ujson.loads(await self.processor.process_command('QUERY users WHERE name = Bob')), [{'key': '1', 'name': 'Bob'}])
+
+    async def test_keys_after_restore(self):
+        await self.processor.process_command('SET a:1 x')
+        self.assertEqual(ujson.loads(await self.processor.process_command('KEYS')), ['a'])
+
+        self.write_backup('data_restore.json', {'b': {'1': 'y'}})
+        await self.processor.process_command('BACKUP RESTORE data_restore.json')
+
+        self.assertEqual(sorted(ujson.loads(await self.processor.process_command('KEYS'))), ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()